@@ -0,0 +1,204 @@
+"""Admission control and request coalescing for /api/process-form.
+
+- SingleFlight lets concurrent identical requests share one computation.
+  The first request (the leader) computes; the others follow along and
+  receive the same items as they are produced, so both the JSON and the
+  streamed NDJSON responses can be served from one flight.
+- RateLimiter is a per-user token bucket.
+- ConcurrencyGate bounds how many computations run at once and rejects
+  the rest immediately, so excess load is shed with a 429 instead of
+  queueing until workers time out.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def request_key(uid, *parts):
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f"{uid}:{digest}"
+
+
+class Flight:
+    # Items produced by one computation, readable by any number of
+    # iterators while it is still running
+    def __init__(self):
+        self.followers = 0
+        self._items = []
+        self._done = False
+        self._error = None
+        self._condition = threading.Condition()
+
+    def publish(self, item):
+        with self._condition:
+            self._items.append(item)
+            self._condition.notify_all()
+
+    def finish(self, error=None):
+        with self._condition:
+            self._done = True
+            self._error = error
+            self._condition.notify_all()
+
+    def __iter__(self):
+        position = 0
+        while True:
+            with self._condition:
+                while position >= len(self._items) and not self._done:
+                    self._condition.wait()
+                if position < len(self._items):
+                    item = self._items[position]
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            position += 1
+            yield item
+
+
+class FlightAborted(Exception):
+    pass
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def join(self, key, admit=None):
+        # Follows the running flight for `key` if there is one, otherwise
+        # registers a new flight for the caller to lead. Both happen under
+        # one lock, so identical requests arriving together always share a
+        # flight, even while the leader is still loading its inputs.
+        # `admit` is asked before leading; if it refuses, nothing is
+        # registered. Returns (flight, leader), or (None, False) if refused.
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.coalesced += 1
+                return flight, False
+            if admit is not None and not admit():
+                return None, False
+            flight = Flight()
+            self._flights[key] = flight
+            return flight, True
+
+    def abandon(self, key, flight, error):
+        # Ends a flight whose leader failed before it could lead(); the
+        # followers receive `error`
+        with self._lock:
+            self._release(key, flight)
+        flight.finish(error)
+
+    def lead(self, key, flight, items, on_done=None):
+        # Returns a generator that consumes `items`, publishing each one to
+        # the followers of `flight` (from join()) as it is yielded.
+        # `on_done` runs once the flight has finished. The caller must
+        # exhaust or close() the generator.
+        # One iterator, so a drain after the leader leaves resumes it
+        items = iter(items)
+
+        def run():
+            error = None
+            try:
+                # Parked here by the next() below, so that close() reaches the
+                # finally block even if the caller never starts iterating
+                yield
+                for item in items:
+                    flight.publish(item)
+                    yield item
+            except GeneratorExit:
+                # The leader's client went away. Finish the computation if
+                # anyone is following it, otherwise drop it.
+                with self._lock:
+                    self._release(key, flight)
+                    followers = flight.followers
+                error = FlightAborted(key)
+                if followers:
+                    try:
+                        for item in items:
+                            flight.publish(item)
+                        error = None
+                    except Exception as e:
+                        error = e
+                raise
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                with self._lock:
+                    self._release(key, flight)
+                flight.finish(error)
+                if on_done:
+                    on_done()
+
+        leader = run()
+        next(leader)
+        return leader
+
+    def _release(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+
+class RateLimiter:
+    # Token bucket per user: `rate` requests per second on average, bursts
+    # of up to `burst`. Buckets for the least recently seen users are
+    # dropped beyond `max_users`; a dropped bucket simply starts full again.
+    def __init__(self, rate, burst, max_users=10000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self.clock = clock
+        self._buckets = OrderedDict()  # uid -> (tokens, updated_at)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def acquire(self, uid):
+        # Returns 0 if the request may proceed, otherwise the seconds until
+        # a token will be available
+        if self.rate <= 0:
+            return 0
+        now = self.clock()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(uid, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+                self.rejected += 1
+            self._buckets[uid] = (tokens, now)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class ConcurrencyGate:
+    def __init__(self, limit):
+        self.limit = limit
+        self._active = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def try_enter(self):
+        with self._lock:
+            if self._active >= self.limit:
+                self.rejected += 1
+                return False
+            self._active += 1
+            return True
+
+    def exit(self):
+        with self._lock:
+            self._active -= 1
+
+    @property
+    def active(self):
+        with self._lock:
+            return self._active
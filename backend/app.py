@@ -1,89 +1,189 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify, g, Response, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
-import google.generativeai as genai
-from datetime import datetime, timedelta
-from firebase_admin import credentials, initialize_app, firestore, auth
-import firebase_admin
+from datetime import datetime, timedelta, timezone
 import json
+import math
 import re
 import jwt
 from functools import wraps
-import requests
+import time
+
+from admission import ConcurrencyGate, RateLimiter, SingleFlight, request_key
+from bulk import InvalidImport, deduplicate, iter_msgpack, iter_ndjson, parse_csv, parse_msgpack, parse_ndjson, validate_rows
+from identity_client import CircuitBreaker, IdentityServiceUnavailable, IdentityToolkitClient
+from index_store import IndexStore
+from features import question_features
+from fallback import FallbackAnswerer, GeminiModel, build_model_answer
+from form_cache import FormAnswerCache, form_fingerprint
+from kb_cache import KnowledgeBaseCache
+from logging_setup import configure_logging
+from matcher import MATCH_ENGINES, IndexCache, get_index_class, iter_matches
+from metrics import render_metrics, request_seconds, stage_seconds
+from principal import CurrentUser, KnownUsers
+from response_encoding import MSGPACK_MIMETYPE, Compressor, encode_response, msgpack, read_body, wants_msgpack
+from services import Lazy, ServiceUnavailable, init_firebase_app, init_gemini_model, init_storage
+from storage import NotFound
+from sync import paginate, parse_limit, parse_since, public_item, sync_time
 
 # Load environment variables
 load_dotenv()
 
-# Debug: Print all environment variables
-print("\nEnvironment Variables:")
-print("FIREBASE_PROJECT_ID:", os.getenv('FIREBASE_PROJECT_ID'))
-print("FIREBASE_PRIVATE_KEY_ID:", os.getenv('FIREBASE_PRIVATE_KEY_ID'))
-print("FIREBASE_PRIVATE_KEY:", "Present" if os.getenv('FIREBASE_PRIVATE_KEY') else "Missing")
-print("FIREBASE_CLIENT_EMAIL:", os.getenv('FIREBASE_CLIENT_EMAIL'))
-print("FIREBASE_CLIENT_ID:", os.getenv('FIREBASE_CLIENT_ID'))
-print("FIREBASE_CLIENT_CERT_URL:", os.getenv('FIREBASE_CLIENT_CERT_URL'))
-print("GEMINI_API_KEY:", "Present" if os.getenv('GEMINI_API_KEY') else "Missing")
-print("\n")
-
-app = Flask(__name__)
-# Configure CORS for Edge extension
-CORS(app, resources={
-    r"/api/*": {
-        "origins": [
-            "chrome-extension://*",  # Chrome extensions
-            "edge-extension://*",    # Edge extensions
-            "moz-extension://*"      # Firefox extensions
-        ],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
-        "supports_credentials": True
-    }
-})
+logger = configure_logging(os.getenv('LOG_LEVEL', 'INFO'), os.getenv('LOG_FORMAT', 'text'))
+
+# All routes live on this blueprint; create_app() builds the Flask app
+api = Blueprint('api', __name__)
 
 # JWT Configuration
 JWT_SECRET = os.getenv('JWT_SECRET', 'your-secret-key')  # Change this in production
 JWT_ALGORITHM = 'HS256'
 
-# Initialize Gemini
-gemini_api_key = os.getenv('GEMINI_API_KEY')
-if not gemini_api_key:
-    print("Warning: GEMINI_API_KEY is not set")
-else:
-    genai.configure(api_key=gemini_api_key)
-    model = genai.GenerativeModel('gemini-1.5-pro-002')
-    print("Gemini API key initialized")
-
-# Initialize Firebase Admin SDK
-try:
-    print("Loading Firebase credentials...")
-    
-    # Get the private key and handle it safely
-    private_key = os.getenv('FIREBASE_PRIVATE_KEY')
-    if not private_key:
-        raise ValueError("FIREBASE_PRIVATE_KEY is not set in environment variables")
-    
-    cred = credentials.Certificate({
-        "type": "service_account",
-        "project_id": os.getenv('FIREBASE_PROJECT_ID'),
-        "private_key_id": os.getenv('FIREBASE_PRIVATE_KEY_ID'),
-        "private_key": private_key.replace('\\n', '\n'),
-        "client_email": os.getenv('FIREBASE_CLIENT_EMAIL'),
-        "client_id": os.getenv('FIREBASE_CLIENT_ID'),
-        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-        "token_uri": "https://oauth2.googleapis.com/token",
-        "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-        "client_x509_cert_url": os.getenv('FIREBASE_CLIENT_CERT_URL')
-    })
-    
-    print("Initializing Firebase Admin SDK...")
-    firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    print("Firebase Admin SDK initialized successfully!")
+# Storage backend: 'firestore' (default) or 'memory' for local benchmarks
+# and load tests. The memory backend doesn't touch Firebase at all, so the
+# register/login/change-password routes are unavailable with it.
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'firestore')
+
+# Firebase, Firestore and Gemini are set up on first use (see services.py),
+# so importing this module stays fast and routes that don't need Firebase
+# keep working when it isn't configured
+firebase_app = Lazy(lambda: init_firebase_app(logger))
+storage = Lazy(lambda: init_storage(STORAGE_BACKEND, firebase_app, logger))
+
+
+def firebase_auth():
+    # The firebase_admin.auth module, once the Firebase app is initialized
+    firebase_app.get()
+    from firebase_admin import auth
+    return auth
+
+
+def init_fallback_answerer():
+    # Model answers for form fields the knowledge base can't match
+    if os.getenv('AI_FALLBACK_ENABLED', 'true').lower() != 'true':
+        return None
+    model = init_gemini_model(os.getenv('GEMINI_API_KEY'), 'gemini-1.5-pro-002', logger)
+    if not model:
+        return None
+    return FallbackAnswerer(
+        GeminiModel(model, timeout=float(os.getenv('AI_FALLBACK_REQUEST_TIMEOUT_SECONDS', '30'))),
+        time_budget=float(os.getenv('AI_FALLBACK_TIME_BUDGET_SECONDS', '3')),
+        cache_size=int(os.getenv('AI_FALLBACK_CACHE_SIZE', '10000'))
+    )
+
+
+fallback_answerer = Lazy(init_fallback_answerer)
+
+# Per-user knowledge base cache, kept in sync by the Q&A handlers
+kb_cache = KnowledgeBaseCache(
+    lambda uid: storage.list_qa(uid),
+    ttl_seconds=int(os.getenv('KB_CACHE_TTL_SECONDS', '300')),
+    max_users=int(os.getenv('KB_CACHE_MAX_USERS', '1000')),
+    max_bytes=int(os.getenv('KB_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+)
+
+# Shared, pooled client for the Identity Toolkit password checks
+identity_client = IdentityToolkitClient(
+    os.getenv('FIREBASE_API_KEY'),
+    base_url=os.getenv('IDENTITY_TOOLKIT_URL', 'https://identitytoolkit.googleapis.com/v1'),
+    connect_timeout=float(os.getenv('IDENTITY_CONNECT_TIMEOUT_SECONDS', '3.05')),
+    read_timeout=float(os.getenv('IDENTITY_READ_TIMEOUT_SECONDS', '10')),
+    max_retries=int(os.getenv('IDENTITY_MAX_RETRIES', '2')),
+    # Keep below the gunicorn worker timeout (30s by default)
+    deadline=float(os.getenv('IDENTITY_DEADLINE_SECONDS', '20')),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv('IDENTITY_BREAKER_FAILURES', '5')),
+        reset_timeout=float(os.getenv('IDENTITY_BREAKER_RESET_SECONDS', '30'))
+    )
+)
+
+# Largest number of Q&A items accepted by one bulk import
+IMPORT_MAX_ITEMS = int(os.getenv('IMPORT_MAX_ITEMS', '5000'))
+
+# Matching engine used when a request doesn't pick one ('overlap' or 'tfidf')
+MATCH_ENGINE = os.getenv('MATCH_ENGINE', 'overlap')
+MATCH_THRESHOLD = float(os.getenv('MATCH_THRESHOLD')) if os.getenv('MATCH_THRESHOLD') else None
+
+# Compiled matching indexes, rebuilt whenever the cached knowledge base
+# changes. With MATCH_INDEX_DIR set, 'overlap' indexes are written there as
+# versioned files that all workers on the node memory-map (see index_store).
+MATCH_INDEX_DIR = os.getenv('MATCH_INDEX_DIR')
+index_store = IndexStore(MATCH_INDEX_DIR) if MATCH_INDEX_DIR else None
+match_indexes = IndexCache(max_size=int(os.getenv('MATCH_INDEX_CACHE_SIZE', '256')), store=index_store)
+
+
+def publish_knowledge_base(uid):
+    # Called after every Q&A write: drops the user's cached form matches and
+    # writes the new shared index file, if enabled. Only done when this
+    # worker has the knowledge base cached; otherwise readers build the file
+    # on demand, which beats reloading the whole knowledge base here.
+    form_cache.invalidate(uid)
+    if index_store is None:
+        return
+    cached = kb_cache.peek_with_version(uid)
+    if cached is None:
+        return
+    try:
+        index_store.publish(uid, *cached)
+    except Exception as e:
+        # The write itself succeeded; readers build the file on demand
+        logger.warning("Could not publish match index for user %s: %s", uid, e)
+
+# Knowledge-base matches for forms a user has filled before
+form_cache = FormAnswerCache(
+    max_entries=int(os.getenv('FORM_CACHE_MAX_ENTRIES', '10000')),
+    max_bytes=int(os.getenv('FORM_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+)
+
+# Admission control for /api/process-form: identical concurrent requests
+# share one computation, each user gets a token bucket (rate 0 disables
+# it), and at most PROCESS_FORM_MAX_CONCURRENCY computations run at once
+# per process; anything beyond that gets a 429 with Retry-After
+form_flights = SingleFlight()
+form_rate_limiter = RateLimiter(
+    rate=float(os.getenv('PROCESS_FORM_RATE_PER_SECOND', '2')),
+    burst=float(os.getenv('PROCESS_FORM_BURST', '10'))
+)
+form_gate = ConcurrencyGate(int(os.getenv('PROCESS_FORM_MAX_CONCURRENCY', '8')))
+FORM_BUSY_RETRY_AFTER_SECONDS = int(os.getenv('PROCESS_FORM_BUSY_RETRY_AFTER_SECONDS', '1'))
+
+# Request timing for the /metrics endpoint
+@api.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@api.after_app_request
+def record_request_time(response):
+    if 'request_start' in g:
+        # Label by view name without the blueprint prefix ('process_form')
+        endpoint = (request.endpoint or 'unknown').rpartition('.')[2]
+        started = g.request_start
+        if response.is_streamed:
+            # The body (matching, fallback, export) is generated after this
+            # hook, so time streamed responses until they are closed
+            response.call_on_close(lambda: request_seconds.observe(endpoint, time.perf_counter() - started))
+        else:
+            request_seconds.observe(endpoint, time.perf_counter() - started)
+    return response
+
+# Response compression (gzip, or brotli when installed) for bodies of at
+# least COMPRESS_MIN_BYTES. Turn it off when a proxy in front already
+# compresses.
+compressor = Compressor(
+    min_size=int(os.getenv('COMPRESS_MIN_BYTES', '1024')),
+    gzip_level=int(os.getenv('COMPRESS_GZIP_LEVEL', '4'))
+) if os.getenv('COMPRESS_RESPONSES', 'true').lower() == 'true' else None
 
-except Exception as e:
-    print(f"Error initializing Firebase: {str(e)}")
-    raise e
+@api.after_app_request
+def compress_response(response):
+    # Registered after record_request_time, so it runs first and its cost
+    # is included in the request timings
+    if compressor:
+        response = compressor(request, response)
+    return response
+
+# uids whose user document has already been checked or created
+known_users = KnownUsers()
 
 # Authentication decorator
 def token_required(f):
@@ -99,38 +199,43 @@ def token_required(f):
             return jsonify({'message': 'Token is missing'}), 401
         
         try:
-            print(f"\nValidating token...")
-            data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-            print(f"Token decoded successfully. User ID: {data['uid']}")
-            
-            user_ref = db.collection('users').document(data['uid'])
-            current_user = user_ref.get()
-            
-            if not current_user.exists:
-                print(f"User document not found for ID: {data['uid']}")
-                # Create the user document if it doesn't exist
-                try:
-                    print(f"Creating user document for ID: {data['uid']}")
-                    user_ref.set({
+            with stage_seconds.time('auth_decode'):
+                data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+            uid = data['uid']
+            logger.debug("Token decoded successfully. User ID: %s", uid)
+        except Exception as e:
+            logger.debug("Token validation error: %s", e)
+            return jsonify({'message': 'Token is invalid'}), 401
+        
+        current_user = CurrentUser(uid, data, storage)
+        
+        # Only check for the user document the first time this process sees
+        # the uid; handlers that need more than the token claims fetch it lazily
+        if uid not in known_users:
+            try:
+                if not current_user.exists:
+                    # Create the user document if it doesn't exist
+                    logger.info("Creating missing user document for ID: %s", uid)
+                    storage.create_user(uid, {
                         'email': data['email'],
-                        'created_at': datetime.now(),
+                        'created_at': datetime.now(timezone.utc),
                         'knowledge_base': []
                     })
-                    current_user = user_ref.get()
-                    print("User document created successfully")
-                except Exception as e:
-                    print(f"Error creating user document: {str(e)}")
-                    return jsonify({'message': 'Error creating user document'}), 500
-            
-            return f(current_user, *args, **kwargs)
-        except Exception as e:
-            print(f"Token validation error: {str(e)}")
-            return jsonify({'message': 'Token is invalid'}), 401
+                    current_user = CurrentUser(uid, data, storage)
+                known_users.add(uid)
+            except ServiceUnavailable as e:
+                logger.error("Storage unavailable: %s", e)
+                return jsonify({'message': 'Service temporarily unavailable'}), 503
+            except Exception as e:
+                logger.error("Error creating user document: %s", e)
+                return jsonify({'message': 'Error creating user document'}), 500
+        
+        return f(current_user, *args, **kwargs)
     
     return decorated
 
 # Authentication endpoints
-@app.route('/api/register', methods=['POST'])
+@api.route('/api/register', methods=['POST'])
 def register():
     try:
         data = request.get_json()
@@ -140,6 +245,7 @@ def register():
         if not email or not password:
             return jsonify({'error': 'Email and password are required'}), 400
         
+        auth = firebase_auth()
         try:
             # Create user in Firebase Auth
             user = auth.create_user(
@@ -150,10 +256,11 @@ def register():
             # Create user document in Firestore
             user_data = {
                 'email': email,
-                'created_at': datetime.now(),
+                'created_at': datetime.now(timezone.utc),
                 'knowledge_base': []
             }
-            db.collection('users').document(user.uid).set(user_data)
+            storage.create_user(user.uid, user_data)
+            known_users.add(user.uid)
             
             # Generate JWT token
             token = jwt.encode({
@@ -175,39 +282,33 @@ def register():
         except Exception as e:
             return jsonify({'error': str(e)}), 400
             
+    except ServiceUnavailable:
+        return jsonify({'error': 'Registration is temporarily unavailable'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     try:
         data = request.get_json()
         email = data.get('email')
         password = data.get('password')
         
-        print(f"\nLogin attempt for email: {email}")
+        logger.debug("Login attempt for email: %s", email)
         
         if not email or not password:
-            print("Error: Email or password missing")
             return jsonify({'error': 'Email and password are required'}), 400
         
+        auth = firebase_auth()
         try:
             # Get user by email
-            print("Attempting to get user from Firebase...")
             user = auth.get_user_by_email(email)
-            print(f"User found in Firebase: {user.uid}")
+            logger.debug("User found in Firebase: %s", user.uid)
             
             # Sign in with email and password to verify credentials
-            sign_in_url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={os.getenv('FIREBASE_API_KEY')}"
-            sign_in_data = {
-                "email": email,
-                "password": password,
-                "returnSecureToken": True
-            }
-            
-            response = requests.post(sign_in_url, json=sign_in_data)
+            response = identity_client.sign_in_with_password(email, password)
             if not response.ok:
-                print(f"Firebase sign in failed: {response.text}")
+                logger.info("Firebase sign in failed: %s", response.text)
                 return jsonify({'error': 'Invalid credentials'}), 401
             
             # Generate JWT token
@@ -217,8 +318,6 @@ def login():
                 'exp': datetime.utcnow() + timedelta(days=1)
             }, JWT_SECRET, algorithm=JWT_ALGORITHM)
             
-            print("JWT token generated successfully")
-            
             return jsonify({
                 'token': token,
                 'user': {
@@ -228,17 +327,22 @@ def login():
             })
             
         except auth.UserNotFoundError:
-            print("Error: User not found in Firebase")
+            logger.info("Login for unknown email")
             return jsonify({'error': 'User not found'}), 401
+        except IdentityServiceUnavailable as e:
+            logger.error("Identity service unavailable during login: %s", e)
+            return jsonify({'error': 'Authentication service unavailable, please try again'}), 503
         except Exception as e:
-            print(f"Firebase error: {str(e)}")
+            logger.error("Firebase error during login: %s", e)
             return jsonify({'error': 'Authentication failed'}), 401
         
+    except ServiceUnavailable:
+        return jsonify({'error': 'Authentication service unavailable, please try again'}), 503
     except Exception as e:
-        print(f"General error: {str(e)}")
+        logger.error("Login error: %s", e)
         return jsonify({'error': 'Invalid credentials'}), 401
 
-@app.route('/api/validate-token', methods=['GET'])
+@api.route('/api/validate-token', methods=['GET'])
 @token_required
 def validate_token(current_user):
     return jsonify({
@@ -249,27 +353,82 @@ def validate_token(current_user):
     })
 
 # Q&A Management endpoints
-@app.route('/api/qa', methods=['GET'])
+@api.route('/api/qa', methods=['GET'])
 @token_required
 def get_qa_items(current_user):
+    # Without query parameters this returns the whole knowledge base as an
+    # array. With ?limit=, ?cursor= or ?since= it returns one page:
+    #   {items, deleted, next_cursor, server_time}
+    # where deleted lists ids removed after `since`, and server_time is the
+    # value to pass as `since` on the next sync.
     try:
-        qa_ref = db.collection('users').document(current_user.id).collection('knowledge_base')
-        qa_docs = qa_ref.get()
-        
-        qa_items = []
-        for doc in qa_docs:
-            qa_data = doc.to_dict()
-            qa_items.append({
-                'id': doc.id,
-                'question': qa_data.get('question', ''),
-                'answer': qa_data.get('answer', '')
-            })
+        since = request.args.get('since')
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit')
+        
+        try:
+            since = parse_since(since) if since else None
+            limit = parse_limit(limit)
+        except ValueError:
+            return jsonify({'error': 'Invalid since or limit'}), 400
+        
+        use_msgpack = wants_msgpack(request)
+        with stage_seconds.time('kb_load'):
+            qa_list, kb_version, loaded_at = kb_cache.get_with_load_time(current_user.id)
+        # The next ?since= must start before anything this response may be
+        # missing: deltas come from storage, so they're complete up to now,
+        # but pages come from this worker's cache, which only has other
+        # workers' writes up to when it was loaded
+        if since is not None:
+            server_time = sync_time()
+        else:
+            server_time = sync_time(datetime.fromtimestamp(loaded_at, timezone.utc))
+        
+        # The ETag is the knowledge base version (per body format), so a
+        # client that already has this version gets a 304 for any first page
+        # or full listing. Compressed responses carry it as a weak ETag.
+        # Deltas skip the check: the cached version can lag behind writes
+        # made through other workers, and the delta itself comes from storage.
+        etag = f'{kb_version}.msgpack' if use_msgpack else kb_version
+        if not cursor and since is None and request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.vary.add('Accept')
+            return response
         
-        return jsonify(qa_items)
+        if since is not None:
+            # Deltas are read from storage, not the cache, so writes made
+            # through other workers are never skipped
+            changed = storage.list_qa_changed_since(current_user.id, since)
+            page, next_cursor = paginate(changed, cursor, limit)
+            deleted = [] if cursor else [tombstone['id'] for tombstone in storage.list_deleted_since(current_user.id, since)]
+            body = {
+                'items': [public_item(qa) for qa in page],
+                'deleted': deleted,
+                'next_cursor': next_cursor,
+                'server_time': server_time
+            }
+        elif cursor or request.args.get('limit'):
+            page, next_cursor = paginate(qa_list, cursor, limit)
+            body = {
+                'items': [public_item(qa) for qa in page],
+                'deleted': [],
+                'next_cursor': next_cursor,
+                'server_time': server_time
+            }
+        else:
+            body = [public_item(qa) for qa in qa_list]
+        
+        with stage_seconds.time('serialization'):
+            response = encode_response(body, use_msgpack)
+        if not cursor:
+            response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/qa', methods=['POST'])
+@api.route('/api/qa', methods=['POST'])
 @token_required
 def add_qa_item(current_user):
     try:
@@ -280,15 +439,18 @@ def add_qa_item(current_user):
         if not question or not answer:
             return jsonify({'error': 'Question and answer are required'}), 400
         
-        qa_ref = db.collection('users').document(current_user.id).collection('knowledge_base')
-        qa_doc = qa_ref.add({
+        qa_data = {
             'question': question,
             'answer': answer,
-            'created_at': datetime.now()
-        })
+            'created_at': datetime.now(timezone.utc),
+            **question_features(question)
+        }
+        qa_id = storage.add_qa(current_user.id, qa_data)
+        kb_cache.add_item(current_user.id, {'id': qa_id, **qa_data})
+        publish_knowledge_base(current_user.id)
         
         return jsonify({
-            'id': qa_doc[1].id,
+            'id': qa_id,
             'question': question,
             'answer': answer
         }), 201
@@ -296,7 +458,7 @@ def add_qa_item(current_user):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/qa/<qa_id>', methods=['PUT'])
+@api.route('/api/qa/<qa_id>', methods=['PUT'])
 @token_required
 def update_qa_item(current_user, qa_id):
     try:
@@ -307,34 +469,107 @@ def update_qa_item(current_user, qa_id):
         if not question or not answer:
             return jsonify({'error': 'Question and answer are required'}), 400
         
-        qa_ref = db.collection('users').document(current_user.id).collection('knowledge_base').document(qa_id)
-        qa_ref.update({
-                            'question': question,
+        qa_data = {
+            'question': question,
             'answer': answer,
-            'updated_at': datetime.now()
-        })
+            'updated_at': datetime.now(timezone.utc),
+            **question_features(question)
+        }
+        storage.update_qa(current_user.id, qa_id, qa_data)
+        kb_cache.update_item(current_user.id, {'id': qa_id, **qa_data})
+        publish_knowledge_base(current_user.id)
         
         return jsonify({
             'id': qa_id,
-                        'question': question,
+            'question': question,
             'answer': answer
         })
         
+    except NotFound:
+        return jsonify({'error': 'Q&A item not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/qa/<qa_id>', methods=['DELETE'])
+@api.route('/api/qa/<qa_id>', methods=['DELETE'])
 @token_required
 def delete_qa_item(current_user, qa_id):
     try:
-        qa_ref = db.collection('users').document(current_user.id).collection('knowledge_base').document(qa_id)
-        qa_ref.delete()
+        storage.delete_qa(current_user.id, qa_id)
+        kb_cache.remove_item(current_user.id, qa_id)
+        publish_knowledge_base(current_user.id)
         return jsonify({'message': 'Q&A item deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Bulk import: NDJSON (one {"question", "answer"} object per line) or CSV
+# with question,answer columns. Questions already in the knowledge base are
+# skipped; everything else is written in Firestore-sized batches.
+@api.route('/api/qa/import', methods=['POST'])
+@token_required
+def import_qa_items(current_user):
+    try:
+        import_format = request.args.get('format') or {
+            'text/csv': 'csv',
+            MSGPACK_MIMETYPE: 'msgpack'
+        }.get(request.mimetype, 'ndjson')
+        formats = ('csv', 'ndjson', 'msgpack') if msgpack else ('csv', 'ndjson')
+        if import_format not in formats:
+            return jsonify({'error': f"Format must be {' or '.join(formats)}"}), 400
+        
+        if import_format == 'msgpack':
+            rows = parse_msgpack(request.get_data())
+        else:
+            text = request.get_data(as_text=True)
+            rows = parse_csv(text) if import_format == 'csv' else parse_ndjson(text)
+        items = validate_rows(rows, IMPORT_MAX_ITEMS)
+        
+        # De-duplicate against a fresh read rather than a possibly stale copy
+        kb_cache.invalidate(current_user.id)
+        new_items, skipped = deduplicate(items, kb_cache.get(current_user.id))
+        
+        created_at = datetime.now(timezone.utc)
+        qa_docs = [{**item, 'created_at': created_at, **question_features(item['question'])} for item in new_items]
+        qa_ids = storage.add_qa_batch(current_user.id, qa_docs)
+        kb_cache.add_items(current_user.id, [{'id': qa_id, **qa_data} for qa_id, qa_data in zip(qa_ids, qa_docs)])
+        publish_knowledge_base(current_user.id)
+        
+        return encode_response({
+            'imported': len(qa_ids),
+            'skipped_duplicates': skipped
+        }, wants_msgpack(request), status=201)
+        
+    except InvalidImport as e:
+        return encode_response({'error': 'Invalid import', 'errors': e.errors[:100]}, wants_msgpack(request), status=400)
+    except Exception as e:
+        # A failed batch may have committed part of the import
+        kb_cache.invalidate(current_user.id)
+        publish_knowledge_base(current_user.id)
+        logger.exception("Error importing Q&A items")
+        return jsonify({'error': str(e)}), 500
+
+# Bulk export as NDJSON (or concatenated msgpack maps with Accept:
+# application/msgpack), streamed straight from storage and compressed on
+# the fly when the client accepts it
+@api.route('/api/qa/export', methods=['GET'])
+@token_required
+def export_qa_items(current_user):
+    qa_items = storage.iter_qa(current_user.id)
+    if wants_msgpack(request):
+        chunks, mimetype, filename = iter_msgpack(qa_items), MSGPACK_MIMETYPE, 'knowledge_base.msgpack'
+    else:
+        chunks, mimetype, filename = iter_ndjson(qa_items), 'application/x-ndjson', 'knowledge_base.ndjson'
+    
+    headers = {'Content-Disposition': f'attachment; filename={filename}'}
+    encoding = compressor.choose(request) if compressor else None
+    if encoding:
+        chunks = compressor.compress_stream(chunks, encoding)
+        headers['Content-Encoding'] = encoding
+    response = Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+    response.vary.add('Accept')
+    return response
+
 # Profile Management endpoints
-@app.route('/api/change-password', methods=['POST'])
+@api.route('/api/change-password', methods=['POST'])
 @token_required
 def change_password(current_user):
     try:
@@ -344,99 +579,285 @@ def change_password(current_user):
         if not new_password:
             return jsonify({'error': 'New password is required'}), 400
         
-        print(f"Updating password for user: {current_user.id}")
+        logger.info("Updating password for user: %s", current_user.id)
         
         # Update password in Firebase Auth
-        auth.update_user(
+        firebase_auth().update_user(
             current_user.id,
             password=new_password
         )
         
         # Verify the password was updated by attempting to sign in
-        sign_in_url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={os.getenv('FIREBASE_API_KEY')}"
-        sign_in_data = {
-            "email": current_user.get('email'),
-            "password": new_password,
-            "returnSecureToken": True
-        }
-        
-        response = requests.post(sign_in_url, json=sign_in_data)
+        response = identity_client.sign_in_with_password(current_user.get('email'), new_password)
         if not response.ok:
-            print(f"Password verification failed: {response.text}")
+            logger.error("Password verification failed: %s", response.text)
             return jsonify({'error': 'Failed to verify password update'}), 500
         
-        print("Password updated and verified successfully")
         return jsonify({'message': 'Password updated successfully'})
         
+    except IdentityServiceUnavailable as e:
+        # The password was changed; only the verification step failed
+        logger.error("Identity service unavailable verifying password update: %s", e)
+        return jsonify({'error': 'Password updated but could not be verified, please try logging in'}), 503
+    except ServiceUnavailable:
+        return jsonify({'error': 'Password changes are temporarily unavailable'}), 503
     except Exception as e:
-        print(f"Error updating password: {str(e)}")
+        logger.error("Error updating password: %s", e)
         return jsonify({'error': str(e)}), 500
 
+def too_many_requests(message, retry_after):
+    response = jsonify({'error': message})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+# Compact process-form answers are rows of these values; fields are
+# referenced by their index in the request instead of echoing question text
+COMPACT_ANSWER_COLUMNS = ['index', 'answer', 'match_score', 'source']
+
+def compact_answer(position, answer):
+    return [position, answer['answer'], answer['match_score'], answer.get('source', 'knowledge_base')]
+
+def resolve_answers(uid, questions, qa_list, kb_version, engine, threshold, use_fallback,
+                    fingerprint, matches=None):
+    # Yields (position, answer) as answers are resolved: knowledge-base
+    # matches first (from the form cache when `matches` is given), then one
+    # batched model call for whatever is left
+    if matches is None:
+        with stage_seconds.time('matching'):
+            index = match_indexes.get(uid, qa_list, engine, kb_version)
+            matches = list(iter_matches(questions, index, threshold))
+        form_cache.put(uid, fingerprint, kb_version, matches)
+    yield from matches
+    
+    answerer = fallback_answerer.get() if use_fallback else None
+    if not answerer:
+        return
+    
+    matched = {position for position, _ in matches}
+    unmatched = [question['question'] for position, question in enumerate(questions) if position not in matched]
+    if not unmatched:
+        return
+    
+    with stage_seconds.time('fallback'):
+        model_answers = answerer.answer(uid, unmatched, qa_list, kb_version)
+    for position, question in enumerate(questions):
+        if position not in matched and question['question'] in model_answers:
+            yield position, build_model_answer(question['question'], model_answers[question['question']])
+
 # Form Processing endpoint
-@app.route('/api/process-form', methods=['POST'])
+# Returns a JSON array of answers in form order, or with "compact": true
+# {"columns": [...], "answers": [[index, answer, match_score, source], ...]}.
+# Accept: application/msgpack returns the same body as MessagePack, and
+# the request body may be msgpack too. With ?stream=1 (or
+# Accept: application/x-ndjson) it instead streams one NDJSON record per
+# answer as soon as it is resolved, {"type": "answer", "index": <field>,
+# ...}, and ends with a {"type": "summary", ...} record. The X-Form-Cache
+# header (and the summary's "cache") says whether the knowledge-base matches
+# came from the form cache: hit, miss, or coalesced with an identical
+# in-flight request.
+@api.route('/api/process-form', methods=['POST'])
 @token_required
 def process_form(current_user):
     try:
-        data = request.get_json()
+        started = time.perf_counter()
+        data = read_body(request)
         questions = data.get('questions', [])
+        compact = bool(data.get('compact', False))
+        use_msgpack = wants_msgpack(request)
+        use_fallback = data.get('fallback', True)
+        engine = data.get('engine', MATCH_ENGINE)
+        threshold = data.get('threshold', MATCH_THRESHOLD)
+        stream = request.args.get('stream') == '1' or request.accept_mimetypes.best == 'application/x-ndjson'
         
-        # Get user's knowledge base
-        kb_ref = db.collection('users').document(current_user.id).collection('knowledge_base')
+        if engine not in MATCH_ENGINES:
+            return jsonify({'error': f"Unknown engine. Use one of: {', '.join(MATCH_ENGINES)}"}), 400
+        if threshold is not None and not isinstance(threshold, (int, float)):
+            return jsonify({'error': 'Threshold must be a number'}), 400
         
-        # Get all Q&A items
-        qa_items = kb_ref.stream()
-        qa_list = [{'id': qa.id, **qa.to_dict()} for qa in qa_items]
+        retry_after = form_rate_limiter.acquire(current_user.id)
+        if retry_after:
+            return too_many_requests('Too many form requests, please slow down', retry_after)
         
-        print(f"\nProcessing form with {len(questions)} questions")
-        print(f"Found {len(qa_list)} Q&A items in knowledge base")
-        
-        answers = []
-        for question in questions:
-            # Normalize the question
-            normalized_question = question['question'].lower().strip()
-            print(f"\nProcessing question: {normalized_question}")
-            
-            # Find matching Q&A item using word-based matching
-            matching_qa = None
-            best_match_score = 0
-            
-            for qa in qa_list:
-                qa_question = qa['question'].lower().strip()
-                print(f"Comparing with Q&A: {qa_question}")
-                
-                # Split questions into words
-                form_words = set(normalized_question.split())
-                qa_words = set(qa_question.split())
+        # Join an identical request that is already being processed, or
+        # register this one as the leader (which takes a gate slot) before
+        # anything is loaded, so requests arriving together share the load
+        key = request_key(current_user.id, questions, engine, threshold, use_fallback)
+        flight, leader = form_flights.join(key, admit=form_gate.try_enter)
+        if flight is None:
+            return too_many_requests('Server is busy, please retry', FORM_BUSY_RETRY_AFTER_SECONDS)
+        if not leader:
+            logger.debug("Coalesced form request for user %s", current_user.id)
+            cache_status = 'coalesced'
+            resolved = flight
+        else:
+            try:
+                # Get user's knowledge base
+                with stage_seconds.time('kb_load'):
+                    qa_list, kb_version = kb_cache.get_with_version(current_user.id)
                 
-                # Calculate word overlap
-                common_words = form_words.intersection(qa_words)
-                match_score = len(common_words) / max(len(form_words), len(qa_words))
+                logger.debug("Processing form with %d questions against %d Q&A items", len(questions), len(qa_list))
                 
-                print(f"Match score: {match_score:.2f} (common words: {common_words})")
-                
-                # Update best match if this score is higher
-                if match_score > best_match_score:
-                    best_match_score = match_score
-                    matching_qa = qa
+                fingerprint = form_fingerprint(questions, engine, threshold)
+                matches = form_cache.get(current_user.id, fingerprint, kb_version, questions)
+            except Exception as e:
+                # Followers get the same error instead of waiting forever
+                form_flights.abandon(key, flight, e)
+                form_gate.exit()
+                raise
+            cache_status = 'miss' if matches is None else 'hit'
+            resolved = form_flights.lead(
+                key, flight,
+                resolve_answers(current_user.id, questions, qa_list, kb_version, engine, threshold,
+                                use_fallback, fingerprint, matches),
+                on_done=form_gate.exit
+            )
+        
+        if stream:
+            def generate():
+                sources = {}
+                try:
+                    for position, answer in resolved:
+                        source = answer.get('source', 'knowledge_base')
+                        sources[source] = sources.get(source, 0) + 1
+                        if compact:
+                            record = {'type': 'answer', 'index': position, 'answer': answer['answer'],
+                                      'match_score': answer['match_score'], 'source': source}
+                        else:
+                            record = {'type': 'answer', 'index': position, **answer}
+                        yield json.dumps(record) + '\n'
+                except Exception as e:
+                    logger.exception("Error streaming form answers")
+                    yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+                yield json.dumps({
+                    'type': 'summary',
+                    'total': len(questions),
+                    'answered': sum(sources.values()),
+                    'sources': sources,
+                    'cache': cache_status,
+                    'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+                }) + '\n'
             
-            # Use a threshold to determine if the match is good enough
-            if matching_qa and best_match_score >= 0.3:  # 30% word overlap threshold
-                answers.append({
-                    'question': question['question'],
-                    'answer': matching_qa['answer'],
-                    'matched_question': matching_qa['question'],
-                    'match_score': best_match_score
-                })
-                print(f"Found match (score: {best_match_score:.2f}): {matching_qa['question']}")
-                print(f"Added answer: {matching_qa['answer']}")
-            else:
-                print(f"No good match found for: {normalized_question}")
-        
-        print(f"\nReturning {len(answers)} answers")
-        return jsonify(answers)
+            response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+            response.headers['X-Form-Cache'] = cache_status
+            # Ends the flight (and frees its gate slot) even if the client
+            # disconnects before the body is read
+            if leader:
+                response.call_on_close(resolved.close)
+            return response
+        
+        resolved = sorted(resolved, key=lambda item: item[0])
+        if compact:
+            body = {
+                'columns': COMPACT_ANSWER_COLUMNS,
+                'answers': [compact_answer(position, answer) for position, answer in resolved]
+            }
+        else:
+            body = [answer for _, answer in resolved]
+        
+        logger.debug("Returning %d answers", len(resolved))
+        with stage_seconds.time('serialization'):
+            response = encode_response(body, use_msgpack)
+        response.headers['X-Form-Cache'] = cache_status
+        return response
     except Exception as e:
-        print(f"Error processing form: {str(e)}")
+        logger.exception("Error processing form")
         return jsonify({'error': str(e)}), 500
 
+# Prometheus metrics for this process. If METRICS_TOKEN is set, scrapers
+# must send it as a Bearer token.
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    metrics_token = os.getenv('METRICS_TOKEN')
+    if metrics_token and request.headers.get('Authorization') != f'Bearer {metrics_token}':
+        return jsonify({'message': 'Unauthorized'}), 401
+    
+    cache_stats = kb_cache.stats()
+    form_stats = form_cache.stats()
+    counters = {
+        'formmate_kb_cache_hits_total': ('Knowledge base cache hits.', cache_stats['hits']),
+        'formmate_kb_cache_misses_total': ('Knowledge base cache misses.', cache_stats['misses']),
+        'formmate_kb_cache_evictions_total': ('Knowledge base cache evictions.', cache_stats['evictions']),
+        'formmate_form_cache_hits_total': ('Form answer cache hits.', form_stats['hits']),
+        'formmate_form_cache_misses_total': ('Form answer cache misses.', form_stats['misses']),
+        'formmate_form_cache_evictions_total': ('Form answer cache evictions.', form_stats['evictions']),
+        'formmate_process_form_coalesced_total': ('Form requests that joined an identical in-flight request.', form_flights.coalesced),
+        'formmate_process_form_rate_limited_total': ('Form requests rejected by the per-user rate limit.', form_rate_limiter.rejected),
+        'formmate_process_form_shed_total': ('Form requests rejected at the concurrency limit.', form_gate.rejected)
+    }
+    gauges = {
+        'formmate_kb_cache_users': ('Users with a cached knowledge base.', cache_stats['users']),
+        'formmate_kb_cache_bytes': ('Approximate size of the knowledge base cache.', cache_stats['bytes']),
+        'formmate_form_cache_entries': ('Cached form answer mappings.', form_stats['entries']),
+        'formmate_form_cache_bytes': ('Approximate size of the form answer cache.', form_stats['bytes']),
+        'formmate_process_form_in_flight': ('Form computations currently running.', form_gate.active),
+        'formmate_identity_circuit_open': ('1 while identity calls are failing fast (circuit open or half-open).',
+                                           int(identity_client.breaker.state != 'closed'))
+    }
+    # Only report the fallback once something has used it; scraping
+    # shouldn't be what loads the model
+    answerer = fallback_answerer.peek()
+    if answerer:
+        fallback_stats = answerer.stats()
+        counters['formmate_fallback_cache_hits_total'] = ('Model fallback cache hits.', fallback_stats['hits'])
+        counters['formmate_fallback_cache_misses_total'] = ('Model fallback cache misses.', fallback_stats['misses'])
+        counters['formmate_fallback_timeouts_total'] = ('Model calls that overran the time budget.', fallback_stats['timeouts'])
+    
+    body = render_metrics([stage_seconds, request_seconds], counters, gauges)
+    return body, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+def warm_services():
+    # Builds what would otherwise be built on the first request. The
+    # Firestore client itself is left to each worker: its gRPC channels
+    # don't survive a fork.
+    started = time.perf_counter()
+    if STORAGE_BACKEND == 'memory':
+        storage.get()
+    else:
+        try:
+            firebase_app.get()
+            # Imported only to load the SDK modules before workers fork;
+            # the names themselves are not used here
+            import firebase_admin.auth, firebase_admin.firestore  # noqa: F401
+        except ServiceUnavailable as e:
+            logger.warning("Firebase not preloaded: %s", e)
+    fallback_answerer.get()
+    get_index_class(MATCH_ENGINE)
+    logger.info("Services preloaded in %.2fs", time.perf_counter() - started)
+
+
+def create_app(preload=None):
+    # With preload (default: PRELOAD_SERVICES, which is off unless set to
+    # true), the SDK imports, Firebase app and model are set up here
+    # instead of on the first request. Pair it with gunicorn --preload so this happens once in the
+    # master before workers fork.
+    if preload is None:
+        preload = os.getenv('PRELOAD_SERVICES', 'false').lower() == 'true'
+
+    app = Flask(__name__)
+    # Configure CORS for Edge extension
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": [
+                "chrome-extension://*",  # Chrome extensions
+                "edge-extension://*",    # Edge extensions
+                "moz-extension://*"      # Firefox extensions
+            ],
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
+            "expose_headers": ["ETag", "X-Form-Cache"],
+            "supports_credentials": True
+        }
+    })
+    app.register_blueprint(api)
+
+    if preload:
+        warm_services()
+    return app
+
+
+# Module-level app for `gunicorn app:app` and `python app.py`
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""One-shot backfill of precomputed question features.
+
+Computes question_tokens / question_fingerprint for every stored Q&A item
+that doesn't have them yet (or has them from an older FEATURES_VERSION)
+and writes them back in batches. Safe to re-run; items that are already
+current are skipped.
+
+Run from the backend directory with the same environment as the app:
+
+    python backfill_features.py              # all users
+    python backfill_features.py --uid <uid>  # one user
+    python backfill_features.py --dry-run    # only count what would change
+"""
+import argparse
+
+from features import FEATURES_VERSION, question_features
+
+
+def backfill_user(storage, uid, dry_run=False):
+    updates = []
+    for qa in storage.iter_qa(uid):
+        if qa.get('question_features_version') != FEATURES_VERSION:
+            updates.append((qa['id'], question_features(qa.get('question', ''))))
+    if updates and not dry_run:
+        storage.update_qa_batch(uid, updates)
+    return len(updates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uid', help='only backfill this user')
+    parser.add_argument('--dry-run', action='store_true', help="count items without writing")
+    args = parser.parse_args()
+
+    from app import logger, storage
+
+    uids = [args.uid] if args.uid else storage.iter_user_ids()
+    users = 0
+    total = 0
+    for uid in uids:
+        updated = backfill_user(storage, uid, args.dry_run)
+        users += 1
+        total += updated
+        if updated:
+            logger.info("%s %d items for user %s", 'Would update' if args.dry_run else 'Updated', updated, uid)
+
+    logger.info("Backfill complete: %d items across %d users%s", total, users, ' (dry run)' if args.dry_run else '')
+
+
+if __name__ == '__main__':
+    main()
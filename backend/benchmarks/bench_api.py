@@ -0,0 +1,165 @@
+"""Benchmark the main API paths against the in-memory storage backend.
+
+Drives /api/validate-token, GET /api/qa and /api/process-form through the
+Flask test client for synthetic users with knowledge bases of 10 to 10k
+entries and forms of 5 to 200 fields, and reports throughput and
+p50/p95/p99 latency per scenario. No Firebase project is needed.
+process-form/<engine> scenarios clear the form cache before each request
+so they measure matching; process-form/cached measures repeat fills.
+
+Run from the backend directory:
+
+    python benchmarks/bench_api.py                      # full matrix
+    python benchmarks/bench_api.py --quick              # smaller matrix
+    python benchmarks/bench_api.py --json before.json   # save results
+    python benchmarks/bench_api.py --compare before.json
+
+--compare exits non-zero if any scenario's p50 regressed by more than
+--tolerance (20% by default) against the saved results.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_JWT_SECRET = 'benchmark-secret'
+os.environ['STORAGE_BACKEND'] = 'memory'
+os.environ['JWT_SECRET'] = BENCH_JWT_SECRET
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('AI_FALLBACK_ENABLED', 'false')
+# Requests are sent back to back from one user; don't rate limit them
+os.environ.setdefault('PROCESS_FORM_RATE_PER_SECOND', '0')
+
+from synthetic import make_form, make_token, seed_user  # noqa: E402
+
+KB_SIZES = (10, 100, 1000, 10000)
+FORM_SIZES = (5, 50, 200)
+QUICK_KB_SIZES = (10, 1000)
+QUICK_FORM_SIZES = (5, 50)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    position = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[position]
+
+
+def run_scenario(send, min_requests, min_seconds, warmup=3):
+    for _ in range(warmup):
+        send()
+
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < min_requests or time.perf_counter() - started < min_seconds:
+        request_start = time.perf_counter()
+        response = send()
+        latencies.append(time.perf_counter() - request_start)
+        if response.status_code >= 400:
+            raise RuntimeError(f"Request failed with {response.status_code}: {response.get_data(as_text=True)}")
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000
+    }
+
+
+def run(kb_sizes, form_sizes, engines, min_requests, min_seconds):
+    import app as backend
+
+    client = backend.app.test_client()
+    results = {}
+
+    def record(name, send):
+        results[name] = run_scenario(send, min_requests, min_seconds)
+        stats = results[name]
+        print(f"{name:<40} {stats['throughput']:>9.1f} req/s  "
+              f"p50 {stats['p50_ms']:>8.2f} ms  p95 {stats['p95_ms']:>8.2f} ms  p99 {stats['p99_ms']:>8.2f} ms")
+
+    auth_headers = {'Authorization': f'Bearer {make_token("bench-auth", BENCH_JWT_SECRET)}'}
+    backend.storage.create_user('bench-auth', {'email': 'bench-auth@example.com', 'knowledge_base': []})
+    record('auth/validate-token', lambda: client.get('/api/validate-token', headers=auth_headers))
+
+    for kb_size in kb_sizes:
+        uid = f'bench-kb-{kb_size}'
+        seed_user(backend.storage, uid, kb_size, seed=kb_size)
+        headers = {'Authorization': f'Bearer {make_token(uid, BENCH_JWT_SECRET)}'}
+        knowledge_base = backend.storage.list_qa(uid)
+
+        record(f'qa/list kb={kb_size}', lambda: client.get('/api/qa', headers=headers))
+
+        for form_size in form_sizes:
+            questions = make_form(form_size, knowledge_base, seed=form_size)
+            for engine in engines:
+                body = {'questions': questions, 'engine': engine}
+
+                def send_uncached():
+                    # Every request repeats the same form, so without this
+                    # only form cache hits would be measured, not matching
+                    backend.form_cache.invalidate(uid)
+                    return client.post('/api/process-form', json=body, headers=headers)
+
+                record(f'process-form/{engine} kb={kb_size} form={form_size}', send_uncached)
+            body = {'questions': questions, 'engine': engines[0]}
+            record(
+                f'process-form/cached kb={kb_size} form={form_size}',
+                lambda: client.post('/api/process-form', json=body, headers=headers)
+            )
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, stats in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        ratio = stats['p50_ms'] / previous['p50_ms'] if previous['p50_ms'] else 1.0
+        marker = ''
+        if ratio > 1 + tolerance:
+            marker = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<40} p50 {previous['p50_ms']:>8.2f} -> {stats['p50_ms']:>8.2f} ms ({ratio:.2f}x){marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='run a smaller matrix')
+    parser.add_argument('--engines', default='overlap', help='comma-separated match engines')
+    parser.add_argument('--min-requests', type=int, default=20)
+    parser.add_argument('--min-seconds', type=float, default=1.0)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='compare p50 against results saved with --json')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    kb_sizes = QUICK_KB_SIZES if args.quick else KB_SIZES
+    form_sizes = QUICK_FORM_SIZES if args.quick else FORM_SIZES
+    results = run(kb_sizes, form_sizes, args.engines.split(','), args.min_requests, args.min_seconds)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark backend startup: import time and time to first request.
+
+Each run starts a fresh interpreter, imports app.py, then sends one
+/api/validate-token and one /api/process-form request through the Flask
+test client, timing each step. Runs use the in-memory storage backend, so
+no Firebase project is needed; pass --gemini-key to include the model
+setup that the first process-form request (or preloading) pays for; the
+form only asks known questions, so the model is never called.
+
+Run from the backend directory:
+
+    python benchmarks/bench_startup.py                  # lazy and preload modes
+    python benchmarks/bench_startup.py --runs 10 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BENCH_JWT_SECRET = 'benchmark-secret'
+
+# Runs in the child interpreter and prints one JSON line of timings
+CHILD_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import app as backend
+imported = time.perf_counter()
+from synthetic import make_token, seed_user
+seed_user(backend.storage, 'bench-startup', 100, seed=1)
+headers = {'Authorization': 'Bearer ' + make_token('bench-startup', %(secret)r)}
+client = backend.app.test_client()
+seeded = time.perf_counter()
+assert client.get('/api/validate-token', headers=headers).status_code == 200
+first_request = time.perf_counter()
+# Known questions only: the model is set up on the first form but never called
+body = {'questions': [{'question': qa['question']} for qa in backend.storage.list_qa('bench-startup')[:5]]}
+assert client.post('/api/process-form', json=body, headers=headers).status_code == 200
+first_form = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (first_request - seeded) * 1000,
+    'first_form_ms': (first_form - first_request) * 1000,
+    'ready_ms': (imported - started + first_form - seeded) * 1000
+}))
+'''
+
+MODES = {
+    'lazy': {'PRELOAD_SERVICES': 'false'},
+    'preload': {'PRELOAD_SERVICES': 'true'}
+}
+
+
+def run_once(mode, gemini_key):
+    env = dict(os.environ)
+    env.update(MODES[mode])
+    env.update({
+        'STORAGE_BACKEND': 'memory',
+        'JWT_SECRET': BENCH_JWT_SECRET,
+        'LOG_LEVEL': 'WARNING',
+        'GEMINI_API_KEY': gemini_key or '',
+        'AI_FALLBACK_ENABLED': 'true' if gemini_key else 'false',
+        'PYTHONPATH': os.pathsep.join([BACKEND_DIR, BENCH_DIR])
+    })
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT % {'secret': BENCH_JWT_SECRET}],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    return {
+        key: {'median': statistics.median(s[key] for s in samples), 'max': max(s[key] for s in samples)}
+        for key in samples[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--modes', default='lazy,preload', help='comma-separated: lazy, preload')
+    parser.add_argument('--gemini-key', help='configure the model (no calls are made)')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.modes.split(','):
+        results[mode] = summarize([run_once(mode, args.gemini_key) for _ in range(args.runs)])
+        stats = results[mode]
+        print(f"{mode:<8} import {stats['import_ms']['median']:>8.1f} ms  "
+              f"first request {stats['first_request_ms']['median']:>7.1f} ms  "
+              f"first form {stats['first_form_ms']['median']:>7.1f} ms  "
+              f"ready {stats['ready_ms']['median']:>8.1f} ms (max {stats['ready_ms']['max']:.1f})")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
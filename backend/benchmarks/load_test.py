@@ -0,0 +1,311 @@
+"""Load test the backend under gunicorn with the extension's traffic mix.
+
+Starts gunicorn on loadtest_app (in-memory storage seeded with synthetic
+users) and replays the calls the extension makes, signed with real JWTs:
+
+    validate   GET /api/validate-token   background.js polling
+    qa         GET /api/qa               popup.js knowledge base listing
+    form       POST /api/process-form    content.js, sent in bursts of
+                                          identical requests (re-renders,
+                                          several tabs on the same form)
+
+Concurrency is ramped through --stages; each virtual user loops, picking
+an action by the --mix weights. For every stage the report shows
+throughput, p50/p95/p99 latency, error rate and 429 (shed) rate per
+endpoint, then the concurrency at which each endpoint saturated: where
+throughput stopped growing by more than --saturation-gain, or errors
+passed 1%.
+
+Run from the backend directory:
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --workers 4 --threads 8 --stages 1,4,16,64
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --jwt-secret ...
+
+With --url nothing is started and the target must already have the
+loadtest-<n> users (e.g. gunicorn --preload loadtest_app:app). Run the
+generator on a different machine or cores than the server for numbers
+that aren't limited by the client.
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic import make_form, make_knowledge_base, make_token  # noqa: E402
+
+LOADTEST_JWT_SECRET = 'loadtest-secret'
+ENDPOINTS = ('validate', 'qa', 'form')
+DEFAULT_MIX = 'validate=60,qa=25,form=15'
+# Error rate past which an endpoint counts as saturated
+ERROR_RATE_LIMIT = 0.01
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    position = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[position]
+
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint in mix: {name}")
+        weights[name] = float(weight)
+    return weights
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, args):
+    env = dict(os.environ)
+    env.update({
+        'JWT_SECRET': args.jwt_secret,
+        'LOADTEST_USERS': str(args.users),
+        'LOADTEST_KB_SIZE': str(args.kb_size),
+        'LOG_LEVEL': 'WARNING',
+        'AI_FALLBACK_ENABLED': 'false',
+        'PYTHONPATH': os.pathsep.join([BACKEND_DIR, BENCH_DIR])
+    })
+    if not args.rate_limit:
+        env['PROCESS_FORM_RATE_PER_SECOND'] = '0'
+    command = [
+        sys.executable, '-m', 'gunicorn', '--preload',
+        '--workers', str(args.workers), '--threads', str(args.threads),
+        '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+        'loadtest_app:app'
+    ]
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {server.returncode}")
+        try:
+            if requests.get(f'{url}/metrics', timeout=1).ok:
+                return server, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, url, uid, secret, weights, forms, burst, stop, record, seed):
+        super().__init__(daemon=True)
+        self.url = url
+        self.headers = {'Authorization': f'Bearer {make_token(uid, secret)}'}
+        self.weights = weights
+        self.forms = forms
+        self.burst = burst
+        self.stop = stop
+        self.record = record
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+
+    def send(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.url + path, headers=self.headers, timeout=30, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        self.record(endpoint, time.perf_counter() - started, status)
+
+    def run(self):
+        names = list(self.weights)
+        weights = [self.weights[name] for name in names]
+        while not self.stop.is_set():
+            endpoint = self.rng.choices(names, weights)[0]
+            if endpoint == 'validate':
+                self.send('validate', 'GET', '/api/validate-token')
+            elif endpoint == 'qa':
+                self.send('qa', 'GET', '/api/qa')
+            else:
+                body = {'questions': self.rng.choice(self.forms)}
+                # A burst is sent concurrently, like several tabs would
+                senders = [
+                    threading.Thread(target=self.send, args=('form', 'POST', '/api/process-form'), kwargs={'json': body})
+                    for _ in range(self.burst - 1)
+                ]
+                for sender in senders:
+                    sender.start()
+                self.send('form', 'POST', '/api/process-form', json=body)
+                for sender in senders:
+                    sender.join()
+
+
+def run_stage(url, concurrency, seconds, args, weights, forms_by_user):
+    samples = {endpoint: [] for endpoint in ENDPOINTS}
+    statuses = {endpoint: {'errors': 0, 'shed': 0} for endpoint in ENDPOINTS}
+    lock = threading.Lock()
+    recording = threading.Event()
+
+    def record(endpoint, latency, status):
+        if not recording.is_set():
+            return
+        with lock:
+            samples[endpoint].append(latency)
+            if status == 429:
+                statuses[endpoint]['shed'] += 1
+            elif status is None or status >= 400:
+                statuses[endpoint]['errors'] += 1
+
+    stop = threading.Event()
+    virtual_users = []
+    for position in range(concurrency):
+        user = position % args.users
+        virtual_users.append(VirtualUser(
+            url, f'loadtest-{user}', args.jwt_secret, weights, forms_by_user[user],
+            args.burst, stop, record, seed=position
+        ))
+    for virtual_user in virtual_users:
+        virtual_user.start()
+
+    # Short warm-up so connection setup isn't measured
+    time.sleep(min(1.0, seconds / 5))
+    recording.set()
+    started = time.perf_counter()
+    time.sleep(seconds)
+    recording.clear()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for virtual_user in virtual_users:
+        virtual_user.join()
+
+    results = {}
+    for endpoint in ENDPOINTS:
+        latencies = sorted(samples[endpoint])
+        count = len(latencies)
+        results[endpoint] = {
+            'requests': count,
+            'throughput': count / elapsed,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'error_rate': statuses[endpoint]['errors'] / count if count else 0.0,
+            'shed_rate': statuses[endpoint]['shed'] / count if count else 0.0
+        }
+    return results
+
+
+def saturation_points(stages, min_gain):
+    # Concurrency at which each endpoint stopped scaling, or None
+    points = {}
+    for endpoint in ENDPOINTS:
+        points[endpoint] = None
+        previous = None
+        for concurrency, results in stages:
+            stats = results[endpoint]
+            if not stats['requests']:
+                continue
+            if stats['error_rate'] > ERROR_RATE_LIMIT or (
+                    previous and stats['throughput'] < previous[1]['throughput'] * (1 + min_gain)):
+                saturated_at = previous or (concurrency, stats)
+                points[endpoint] = {
+                    'concurrency': saturated_at[0],
+                    'throughput': saturated_at[1]['throughput'],
+                    'p95_ms': saturated_at[1]['p95_ms']
+                }
+                break
+            previous = (concurrency, stats)
+    return points
+
+
+def print_stage(concurrency, results):
+    for endpoint in ENDPOINTS:
+        stats = results[endpoint]
+        if not stats['requests']:
+            continue
+        print(f"c={concurrency:<4} {endpoint:<9} {stats['throughput']:>8.1f} req/s  "
+              f"p50 {stats['p50_ms']:>8.2f}  p95 {stats['p95_ms']:>8.2f}  p99 {stats['p99_ms']:>8.2f} ms  "
+              f"errors {stats['error_rate']:>6.1%}  429 {stats['shed_rate']:>6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='target a running server instead of starting gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--stages', default='1,2,4,8,16,32', help='comma-separated concurrency levels')
+    parser.add_argument('--stage-seconds', type=float, default=10.0)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'endpoint weights (default {DEFAULT_MIX})')
+    parser.add_argument('--burst', type=int, default=3, help='identical process-form requests per burst')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--kb-size', type=int, default=500)
+    parser.add_argument('--form-size', type=int, default=30)
+    parser.add_argument('--forms-per-user', type=int, default=3)
+    parser.add_argument('--rate-limit', action='store_true', help="keep the server's per-user rate limit")
+    parser.add_argument('--saturation-gain', type=float, default=0.1)
+    parser.add_argument('--jwt-secret', default=LOADTEST_JWT_SECRET)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    # The same deterministic knowledge bases the server seeds, so forms
+    # partly match like real ones do
+    forms_by_user = [
+        [make_form(args.form_size, make_knowledge_base(args.kb_size, seed=user), seed=user * 100 + form)
+         for form in range(args.forms_per_user)]
+        for user in range(args.users)
+    ]
+
+    server = None
+    url = args.url
+    if not url:
+        server, url = start_server(free_port(), args)
+        print(f"gunicorn: {args.workers} workers x {args.threads} threads, "
+              f"{args.users} users with {args.kb_size} Q&A items each")
+
+    stages = []
+    try:
+        for concurrency in [int(level) for level in args.stages.split(',')]:
+            results = run_stage(url, concurrency, args.stage_seconds, args, args.mix, forms_by_user)
+            stages.append((concurrency, results))
+            print_stage(concurrency, results)
+    finally:
+        if server:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+    points = saturation_points(stages, args.saturation_gain)
+    print()
+    for endpoint, point in points.items():
+        if point:
+            print(f"{endpoint:<9} saturates at concurrency {point['concurrency']} "
+                  f"(~{point['throughput']:.1f} req/s, p95 {point['p95_ms']:.1f} ms)")
+        else:
+            print(f"{endpoint:<9} still scaling at concurrency {stages[-1][0] if stages else 0}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'config': {key: value for key, value in vars(args).items() if key not in ('json', 'jwt_secret')},
+                'stages': [{'concurrency': concurrency, 'results': results} for concurrency, results in stages],
+                'saturation': points
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""WSGI entry point for load tests: the app on seeded in-memory storage.
+
+Run under gunicorn with --preload so the users are seeded once in the
+master and inherited by every worker (each worker still has its own
+MemoryStorage, so writes are not shared). load_test.py starts it; the
+seed is controlled by:
+
+    LOADTEST_USERS     number of users, uids loadtest-0 .. loadtest-N-1
+    LOADTEST_KB_SIZE   Q&A items per user
+
+JWT_SECRET must match the one the load generator signs tokens with.
+"""
+import os
+
+os.environ['STORAGE_BACKEND'] = 'memory'
+
+from app import app, storage  # noqa: E402,F401
+from synthetic import seed_user  # noqa: E402
+
+LOADTEST_USERS = int(os.getenv('LOADTEST_USERS', '50'))
+LOADTEST_KB_SIZE = int(os.getenv('LOADTEST_KB_SIZE', '500'))
+
+
+def user_id(position):
+    return f'loadtest-{position}'
+
+
+for position in range(LOADTEST_USERS):
+    seed_user(storage, user_id(position), LOADTEST_KB_SIZE, seed=position)
@@ -0,0 +1,59 @@
+"""Deterministic synthetic users, knowledge bases and forms for benchmarks."""
+import random
+
+import jwt
+
+WORDS = (
+    'what is your full name first last middle email address phone number mobile '
+    'home work current permanent city state country zip postal code date of birth '
+    'age gender nationality college university school degree branch major stream '
+    'year graduation cgpa percentage grade score roll registration prn id student '
+    'employee company organization role position title designation experience years '
+    'months skills languages known programming linkedin github portfolio website '
+    'profile resume cv link upload notice period join joining availability expected '
+    'salary ctc stipend relocate willing preferred location shift timing reference '
+    'referral source how did you hear about us hobbies interests achievements '
+    'certifications projects internship previous manager contact emergency relation '
+    'blood group marital status father mother guardian occupation income category '
+    'caste religion passport aadhar pan number bank account ifsc tshirt size food '
+    'preference allergies dietary accommodation transport laptop own team lead'
+).split()
+
+
+def make_question(rng, min_words=2, max_words=8):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))).capitalize()
+
+
+def make_knowledge_base(size, seed=0):
+    rng = random.Random(seed)
+    return [
+        {'question': make_question(rng), 'answer': f'Answer {position}'}
+        for position in range(size)
+    ]
+
+
+def make_form(size, knowledge_base, seed=0, known_fraction=0.6):
+    # About `known_fraction` of the fields are reworded knowledge-base
+    # questions; the rest are unrelated and should not match
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(size):
+        if knowledge_base and rng.random() < known_fraction:
+            words = rng.choice(knowledge_base)['question'].split()
+            rng.shuffle(words)
+            if len(words) > 2:
+                words.pop()
+            questions.append({'question': ' '.join(words)})
+        else:
+            questions.append({'question': make_question(rng)})
+    return questions
+
+
+def make_token(uid, secret, algorithm='HS256'):
+    return jwt.encode({'uid': uid, 'email': f'{uid}@example.com'}, secret, algorithm=algorithm)
+
+
+def seed_user(storage, uid, kb_size, seed=0):
+    storage.create_user(uid, {'email': f'{uid}@example.com', 'knowledge_base': []})
+    for qa in make_knowledge_base(kb_size, seed):
+        storage.add_qa(uid, dict(qa))
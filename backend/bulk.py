@@ -0,0 +1,109 @@
+"""Parsing, validation and serialization for bulk Q&A import/export."""
+import csv
+import io
+import json
+
+from matcher import normalize_question
+from response_encoding import pack, unpack
+
+
+class InvalidImport(ValueError):
+    # Raised with a list of {'line', 'error'} dicts describing invalid rows
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid rows")
+        self.errors = errors
+
+
+def strip_bom(text):
+    # Excel and Notepad save UTF-8 with a byte order mark, which would
+    # otherwise end up in the first header name or JSON line
+    return text[1:] if text.startswith('\ufeff') else text
+
+
+def parse_ndjson(text):
+    rows = []
+    for line_number, line in enumerate(strip_bom(text).splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            rows.append((line_number, json.loads(line)))
+        except ValueError as e:
+            rows.append((line_number, e))
+    return rows
+
+
+def parse_msgpack(data):
+    # A msgpack array of {question, answer} maps; "lines" are array positions
+    try:
+        payload = unpack(data)
+    except Exception as e:
+        raise InvalidImport([{'line': None, 'error': f'Invalid msgpack: {e}'}])
+    if not isinstance(payload, list):
+        raise InvalidImport([{'line': None, 'error': 'Expected an array'}])
+    return list(enumerate(payload, 1))
+
+
+def parse_csv(text):
+    reader = csv.DictReader(io.StringIO(strip_bom(text)))
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    # Line 1 is the header
+    return [(line_number, row) for line_number, row in enumerate(reader, 2)]
+
+
+def validate_rows(rows, max_items):
+    items = []
+    errors = []
+    for line_number, row in rows:
+        if isinstance(row, Exception):
+            errors.append({'line': line_number, 'error': f'Invalid JSON: {row}'})
+            continue
+        if not isinstance(row, dict):
+            errors.append({'line': line_number, 'error': 'Expected an object'})
+            continue
+        question = row.get('question')
+        answer = row.get('answer')
+        if not isinstance(question, str) or not question.strip() \
+                or not isinstance(answer, str) or not answer.strip():
+            errors.append({'line': line_number, 'error': 'Question and answer are required'})
+            continue
+        items.append({'question': question.strip(), 'answer': answer.strip()})
+
+    if len(items) > max_items:
+        errors.append({'line': None, 'error': f'At most {max_items} items can be imported at once'})
+    if errors:
+        raise InvalidImport(errors)
+    return items
+
+
+def deduplicate(items, existing_qa):
+    # Drops items whose question is already in the knowledge base or appears
+    # earlier in the same import. Returns (new_items, skipped_count).
+    seen = {normalize_question(qa.get('question', '')) for qa in existing_qa}
+    new_items = []
+    for item in items:
+        key = normalize_question(item['question'])
+        if key in seen:
+            continue
+        seen.add(key)
+        new_items.append(item)
+    return new_items, len(items) - len(new_items)
+
+
+def export_item(qa):
+    return {
+        'id': qa['id'],
+        'question': qa.get('question', ''),
+        'answer': qa.get('answer', '')
+    }
+
+
+def iter_ndjson(qa_items):
+    for qa in qa_items:
+        yield json.dumps(export_item(qa)) + '\n'
+
+
+def iter_msgpack(qa_items):
+    # Concatenated msgpack maps, readable with msgpack.Unpacker
+    for qa in qa_items:
+        yield pack(export_item(qa))
@@ -0,0 +1,188 @@
+"""Model fallback for form fields with no knowledge-base match.
+
+All unmatched fields from one form go to the model in a single prompt,
+together with the most relevant knowledge-base entries. Answers are cached
+per (user, normalized question, knowledge-base version), and each request
+waits at most `time_budget` seconds. A call that overruns keeps running in
+the background and fills the cache for the next request, until the
+model's own request timeout ends it and frees its slot.
+
+The model is anything with a `generate(prompt) -> str` method; GeminiModel
+adapts google.generativeai, and tests can pass a local fake.
+"""
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from matcher import normalize_question, tokenize
+
+logger = logging.getLogger('formmate.fallback')
+
+FALLBACK_PROMPT = """You help fill in web forms using facts the user has saved about themselves.
+
+Saved facts (question -> answer):
+{context}
+
+Form fields:
+{fields}
+
+Reply with only a JSON object that maps each field number to its answer as a
+string. Use null when the saved facts don't contain the answer; never guess.
+"""
+
+
+class GeminiModel:
+    def __init__(self, model, timeout=30.0):
+        self.model = model
+        self.timeout = timeout
+
+    def generate(self, prompt):
+        # Without a timeout a hung call would hold its in-flight slot forever
+        return self.model.generate_content(prompt, request_options={'timeout': self.timeout}).text
+
+
+def cache_key(uid, question, kb_version):
+    digest = hashlib.sha256(normalize_question(question).encode('utf-8')).hexdigest()
+    return (uid, digest, kb_version)
+
+
+def select_context(questions, qa_list, max_items):
+    if len(qa_list) <= max_items:
+        return qa_list
+
+    # Rank entries by how many words they share with the unmatched fields
+    form_words = set()
+    for question in questions:
+        form_words |= tokenize(question)
+    ranked = sorted(
+        qa_list,
+        key=lambda qa: len(form_words & tokenize(qa.get('question', ''))),
+        reverse=True
+    )
+    return ranked[:max_items]
+
+
+def build_prompt(questions, context):
+    context_lines = '\n'.join(f"- {qa['question']} -> {qa['answer']}" for qa in context)
+    field_lines = '\n'.join(f"{number}. {question}" for number, question in enumerate(questions, 1))
+    return FALLBACK_PROMPT.format(context=context_lines or '(none)', fields=field_lines)
+
+
+def parse_response(text, count):
+    # A list of `count` answers (None where the model had none), or None if
+    # the reply isn't a JSON object at all. Models sometimes wrap the JSON
+    # in prose or code fences.
+    start = text.find('{')
+    end = text.rfind('}')
+    if start == -1 or end < start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    answers = []
+    for number in range(1, count + 1):
+        answer = data.get(str(number))
+        if isinstance(answer, (int, float)) and not isinstance(answer, bool):
+            answer = str(answer)
+        if isinstance(answer, str) and answer.strip():
+            answers.append(answer.strip())
+        else:
+            answers.append(None)
+    return answers
+
+
+def build_model_answer(question, answer):
+    return {
+        'question': question,
+        'answer': answer,
+        'matched_question': None,
+        'match_score': None,
+        'source': 'model'
+    }
+
+
+class FallbackAnswerer:
+    def __init__(self, model, time_budget=3.0, cache_size=10000,
+                 max_context_items=50, max_in_flight=4):
+        self.model = model
+        self.time_budget = time_budget
+        self.cache_size = cache_size
+        self.max_context_items = max_context_items
+        self.max_in_flight = max_in_flight
+
+        self._cache = OrderedDict()  # cache_key -> answer (None = no answer)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight)
+
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+
+    def answer(self, uid, questions, qa_list, kb_version):
+        # Returns {question: answer} for the questions the model could answer
+        answers = {}
+        pending = []
+        with self._lock:
+            for question in dict.fromkeys(questions):
+                key = cache_key(uid, question, kb_version)
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    if self._cache[key] is not None:
+                        answers[question] = self._cache[key]
+                else:
+                    self.misses += 1
+                    pending.append(question)
+
+            # Shed the model call rather than queue behind stalled ones
+            if not pending or self._in_flight >= self.max_in_flight:
+                return answers
+            self._in_flight += 1
+
+        context = select_context(pending, qa_list, self.max_context_items)
+        prompt = build_prompt(pending, context)
+        future = self._executor.submit(self._generate, uid, pending, prompt, kb_version)
+        try:
+            answers.update(future.result(timeout=self.time_budget))
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+        except Exception as e:
+            logger.warning("Model fallback failed: %s", e)
+        return answers
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'timeouts': self.timeouts,
+                'entries': len(self._cache)
+            }
+
+    def _generate(self, uid, questions, prompt, kb_version):
+        try:
+            results = parse_response(self.model.generate(prompt), len(questions))
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        if results is None:
+            # A malformed reply says nothing about the questions; leave them
+            # uncached so the next request asks again
+            logger.warning("Model fallback reply was not a JSON object")
+            return {}
+
+        with self._lock:
+            for question, answer in zip(questions, results):
+                self._cache[cache_key(uid, question, kb_version)] = answer
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return {question: answer for question, answer in zip(questions, results) if answer}
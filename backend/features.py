@@ -0,0 +1,70 @@
+"""Normalized question features, computed once when a Q&A item is written.
+
+Each stored question gets a canonical token list (lowercased words with
+punctuation, stopwords and common suffixes stripped) and a fingerprint of
+that list. The matcher reads these fields instead of re-tokenizing every
+stored question on every request.
+"""
+import hashlib
+import re
+
+# Bump when the tokenization below changes; the backfill script rewrites
+# any document whose features were computed by an older version
+FEATURES_VERSION = 1
+
+WORD_RE = re.compile(r'\w+')
+
+STOPWORDS = frozenset((
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'am',
+    'of', 'to', 'in', 'on', 'for', 'and', 'or', 'at', 'by', 'from', 'with',
+    'as', 'if', 'it', 'its', 'this', 'that', 'these', 'those',
+    'i', 'me', 'my', 'we', 'us', 'our', 'you', 'your', 'yours',
+    'what', 'which', 'who', 'whom', 'how', 'when', 'where',
+    'do', 'does', 'did', 'can', 'could', 'will', 'would', 'should',
+    'have', 'has', 'had', 'any', 'please', 'enter', 'provide', 'mention'
+))
+
+
+def stem(word):
+    # Light suffix stripping: enough to line up plurals and simple verb
+    # forms ("addresses", "joining", "cities") without a full stemmer
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    for suffix in ('ing', 'ed'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    if len(word) > 4 and word.endswith('es') and (word[-3] in 'sxz' or word[-4:-2] in ('ch', 'sh')):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def question_tokens(text):
+    words = WORD_RE.findall(text.lower())
+    tokens = [stem(word) for word in words if word not in STOPWORDS]
+    # A question made only of stopwords still needs something to match on
+    if not tokens:
+        tokens = [stem(word) for word in words]
+    return sorted(set(tokens))
+
+
+def question_fingerprint(tokens):
+    return hashlib.sha1(' '.join(tokens).encode('utf-8')).hexdigest()
+
+
+def question_features(text):
+    tokens = question_tokens(text)
+    return {
+        'question_tokens': tokens,
+        'question_fingerprint': question_fingerprint(tokens),
+        'question_features_version': FEATURES_VERSION
+    }
+
+
+def stored_tokens(qa):
+    # Precomputed tokens when they are current, otherwise computed now (for
+    # documents written before features existed and not yet backfilled)
+    if qa.get('question_features_version') == FEATURES_VERSION and 'question_tokens' in qa:
+        return qa['question_tokens']
+    return question_tokens(qa.get('question', ''))
@@ -0,0 +1,113 @@
+"""Cache of knowledge-base matches for forms a user has filled before.
+
+People fill the same application and registration forms repeatedly. The
+matches for a form are stored under (uid, fingerprint of the normalized
+question list and match options, knowledge base version), so a repeat
+fill is one hash and one lookup. Any Q&A write changes the knowledge base
+version, which makes the user's old entries unreachable; the Q&A handlers
+also drop them right away to free the space.
+
+Entries are kept in an LRU bounded by count and approximate byte size.
+Model answers are not stored here: FallbackAnswerer caches those per
+question, and keeps retrying the ones that timed out.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from matcher import normalize_question
+
+# Rough per-entry and per-answer overhead on top of string sizes
+ENTRY_OVERHEAD_BYTES = 300
+ANSWER_OVERHEAD_BYTES = 150
+
+
+def form_fingerprint(questions, *options):
+    normalized = [normalize_question(question.get('question', '')) for question in questions]
+    payload = json.dumps([normalized, options], separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def estimate_size(matches):
+    size = ENTRY_OVERHEAD_BYTES
+    for _, answer in matches:
+        size += ANSWER_OVERHEAD_BYTES + len(answer['answer']) + len(answer['matched_question'])
+    return size
+
+
+class FormAnswerCache:
+    def __init__(self, max_entries=10000, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()  # (uid, fingerprint, kb_version) -> (matches, size)
+        self._keys_by_user = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, uid, fingerprint, kb_version, questions):
+        # Returns [(position, answer)] for the matched fields, with each
+        # answer's 'question' taken from `questions`, or None on a miss
+        key = (uid, fingerprint, kb_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return [
+            (position, {'question': questions[position]['question'], **answer})
+            for position, answer in entry[0]
+        ]
+
+    def put(self, uid, fingerprint, kb_version, matches):
+        # The form's own question text is dropped; it is filled back in from
+        # the request on a hit, since normalized-equal forms share an entry
+        stored = tuple(
+            (position, {key: value for key, value in answer.items() if key != 'question'})
+            for position, answer in matches
+        )
+        size = estimate_size(stored)
+        if size > self.max_bytes:
+            return
+        key = (uid, fingerprint, kb_version)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (stored, size)
+            self._keys_by_user.setdefault(uid, set()).add(key)
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, uid):
+        with self._lock:
+            for key in list(self._keys_by_user.get(uid, ())):
+                self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes
+            }
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._total_bytes -= entry[1]
+        user_keys = self._keys_by_user.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._keys_by_user[key[0]]
@@ -0,0 +1,151 @@
+"""Client for the Firebase Identity Toolkit REST API.
+
+One pooled requests.Session is shared by all handlers, so logins reuse
+kept-alive TLS connections. Every call has connect/read timeouts and an
+overall deadline that stays below the gunicorn worker timeout. Only
+failures where the request was certainly not processed (connection
+errors, 429, 503) are retried, with exponential backoff; a password
+sign-in that timed out mid-read is not sent again. A circuit breaker
+fails fast while the upstream is down instead of tying up workers.
+
+The session and base URL are injectable so tests can point the client at
+a local stub server or a fake transport.
+"""
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+IDENTITY_TOOLKIT_URL = 'https://identitytoolkit.googleapis.com/v1'
+
+# Upstream statuses that mean the request was not processed and may be
+# retried
+RETRY_STATUSES = (429, 503)
+# Statuses that count as the upstream being unavailable
+UNAVAILABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class IdentityServiceUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # Opens after `failure_threshold` consecutive failures and rejects calls
+    # for `reset_timeout` seconds. After that one trial call is let through;
+    # success closes the circuit, failure opens it again.
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self.clock() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self.clock() - self._opened_at < self.reset_timeout or self._trial_in_progress:
+                return False
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+
+
+def make_session(pool_size=10):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class IdentityToolkitClient:
+    def __init__(self, api_key, session=None, base_url=IDENTITY_TOOLKIT_URL,
+                 connect_timeout=3.05, read_timeout=10.0, max_retries=2,
+                 backoff=0.2, deadline=20.0, breaker=None, sleep=time.sleep,
+                 clock=time.monotonic):
+        self.api_key = api_key
+        self.session = session or make_session()
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+        self.clock = clock
+
+    def sign_in_with_password(self, email, password):
+        return self._post('accounts:signInWithPassword', {
+            'email': email,
+            'password': password,
+            'returnSecureToken': True
+        })
+
+    def _post(self, method, payload):
+        if not self.breaker.allow():
+            raise IdentityServiceUnavailable('Identity service circuit is open')
+
+        url = f"{self.base_url}/{method}"
+        deadline = self.clock() + self.deadline
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # Exponential backoff with jitter, if there is time left
+                delay = self.backoff * (2 ** (attempt - 1)) * (1 + random.random())
+                if self.clock() + delay >= deadline:
+                    break
+                self.sleep(delay)
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                break
+            # Connect and read can both run to their timeouts, so scale them
+            # down together to fit what is left of the deadline
+            scale = min(1.0, remaining / (self.connect_timeout + self.read_timeout))
+            timeout = (self.connect_timeout * scale, self.read_timeout * scale)
+            try:
+                response = self.session.post(url, params={'key': self.api_key}, json=payload, timeout=timeout)
+            except requests.ConnectionError as e:
+                # Includes connect timeouts: nothing reached the upstream
+                last_error = e
+                continue
+            except requests.RequestException as e:
+                # e.g. a read timeout: the sign-in may have been processed
+                last_error = e
+                break
+            if response.status_code in UNAVAILABLE_STATUSES:
+                last_error = IdentityServiceUnavailable(f"Identity service returned {response.status_code}")
+                if response.status_code in RETRY_STATUSES:
+                    continue
+                break
+            self.breaker.record_success()
+            return response
+
+        self.breaker.record_failure()
+        raise IdentityServiceUnavailable(str(last_error or 'Identity service deadline exceeded')) from last_error
@@ -0,0 +1,332 @@
+"""Compiled 'overlap' match indexes stored as memory-mapped files.
+
+With MATCH_INDEX_DIR set, each user's index is written once to a compact
+binary file named after the knowledge base version, and every worker on
+the node maps that file read-only instead of building its own copy. The
+pages are shared through the OS page cache, so index memory no longer
+grows with the worker count. Files are written to a temporary name and
+renamed into place, so readers only ever see complete files.
+
+File layout (little-endian; sections 8-byte aligned):
+
+    header        HEADER below: magic, format and features versions, the
+                  knowledge base version, counts and section offsets
+    entries       n_entries x ENTRY_FIELDS u32: id, question and answer as
+                  (offset, length) into the string blob, then token count
+    tokens        n_tokens x TOKEN_FIELDS u32: token (offset, length) into
+                  the string blob, then (start, count) into postings;
+                  sorted by token bytes
+    postings      u32 entry positions, ascending within each token
+    fingerprints  n_fingerprints x 20-byte SHA-1 digests, sorted, followed
+                  by the u32 entry position for each
+    strings       UTF-8 blob
+"""
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+
+from features import FEATURES_VERSION, question_fingerprint, question_tokens, stored_tokens
+from matcher import MatchIndex, overlap_score
+
+logger = logging.getLogger('formmate.index_store')
+
+MAGIC = b'FMIX'
+# Bump when the layout below changes; older files are then rebuilt
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<4sHH40sIII5Q')
+ENTRY_FIELDS = 7
+TOKEN_FIELDS = 4
+FINGERPRINT_BYTES = 20
+
+# Index files kept per user; older versions are removed on publish
+KEEP_VERSIONS = 2
+
+
+def _u32(values):
+    data = array('I', values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _pad(size):
+    return (-size) % 8
+
+
+def encode_index(qa_list, kb_version):
+    strings = bytearray()
+
+    def add_string(text):
+        encoded = text.encode('utf-8')
+        offset = len(strings)
+        strings.extend(encoded)
+        return offset, len(encoded)
+
+    entries = []
+    postings_by_token = {}
+    fingerprints = {}
+    for position, qa in enumerate(qa_list):
+        words = stored_tokens(qa)
+        for value in (qa['id'], qa.get('question', ''), qa.get('answer', '')):
+            entries.extend(add_string(value))
+        entries.append(len(words))
+        for word in words:
+            postings_by_token.setdefault(word.encode('utf-8'), []).append(position)
+
+        # Same fingerprint rules as MatchIndex
+        if qa.get('question_features_version') == FEATURES_VERSION and 'question_fingerprint' in qa:
+            fingerprint = qa['question_fingerprint']
+        else:
+            fingerprint = question_fingerprint(words)
+        if words:
+            fingerprints.setdefault(bytes.fromhex(fingerprint), position)
+
+    tokens = []
+    postings = []
+    for token in sorted(postings_by_token):
+        offset = len(strings)
+        strings.extend(token)
+        tokens.extend((offset, len(token), len(postings), len(postings_by_token[token])))
+        postings.extend(postings_by_token[token])
+
+    fingerprint_keys = sorted(fingerprints)
+    sections = [
+        _u32(entries),
+        _u32(tokens),
+        _u32(postings),
+        b''.join(fingerprint_keys) + _u32(fingerprints[key] for key in fingerprint_keys),
+        bytes(strings)
+    ]
+
+    offsets = []
+    offset = HEADER.size + _pad(HEADER.size)
+    for section in sections:
+        offsets.append(offset)
+        offset += len(section) + _pad(len(section))
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, FEATURES_VERSION, kb_version.encode('ascii'),
+        len(qa_list), len(postings_by_token), len(fingerprint_keys), *offsets
+    )
+    parts = [header, b'\0' * _pad(len(header))]
+    for section in sections:
+        parts.extend((section, b'\0' * _pad(len(section))))
+    return b''.join(parts)
+
+
+class InvalidIndexFile(ValueError):
+    pass
+
+
+class MappedIndex:
+    # Read-only view of an index file with the same interface and results
+    # as matcher.MatchIndex
+    default_threshold = MatchIndex.default_threshold
+
+    def __init__(self, path, kb_version):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._load(kb_version)
+        except Exception:
+            self.close()
+            raise
+
+    def _load(self, kb_version):
+        if sys.byteorder != 'little':
+            raise InvalidIndexFile("Index files are only mapped on little-endian hosts")
+        if len(self._map) < HEADER.size:
+            raise InvalidIndexFile("Truncated index file")
+        (magic, format_version, features_version, file_kb_version,
+         n_entries, n_tokens, n_fingerprints, *offsets) = HEADER.unpack_from(self._map)
+        if magic != MAGIC or format_version != FORMAT_VERSION or features_version != FEATURES_VERSION:
+            raise InvalidIndexFile("Index file was written by another version")
+        if file_kb_version.decode('ascii') != kb_version:
+            raise InvalidIndexFile("Index file is for another knowledge base version")
+
+        entries_at, tokens_at, postings_at, fingerprints_at, strings_at = offsets
+        view = memoryview(self._map)
+        self._entries = view[entries_at:entries_at + 4 * ENTRY_FIELDS * n_entries].cast('I')
+        self._tokens = view[tokens_at:tokens_at + 4 * TOKEN_FIELDS * n_tokens].cast('I')
+        self._postings = view[postings_at:fingerprints_at].cast('I')
+        keys_end = fingerprints_at + FINGERPRINT_BYTES * n_fingerprints
+        self._fingerprint_keys = fingerprints_at
+        self._fingerprint_positions = view[keys_end:keys_end + 4 * n_fingerprints].cast('I')
+        self._strings = strings_at
+        self.size = n_entries
+        self._n_tokens = n_tokens
+        self._n_fingerprints = n_fingerprints
+
+    def close(self):
+        # Views must be released before the map can be closed
+        for name in ('_entries', '_tokens', '_postings', '_fingerprint_positions'):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        self._map.close()
+
+    def _string(self, offset, length):
+        start = self._strings + offset
+        return self._map[start:start + length]
+
+    def entry(self, position):
+        base = position * ENTRY_FIELDS
+        fields = self._entries[base:base + 6]
+        return {
+            'id': self._string(fields[0], fields[1]).decode('utf-8'),
+            'question': self._string(fields[2], fields[3]).decode('utf-8'),
+            'answer': self._string(fields[4], fields[5]).decode('utf-8')
+        }
+
+    def _entry_size(self, position):
+        return self._entries[position * ENTRY_FIELDS + 6]
+
+    def _postings_for(self, token):
+        # Binary search over the sorted token table
+        low, high = 0, self._n_tokens
+        while low < high:
+            middle = (low + high) // 2
+            base = middle * TOKEN_FIELDS
+            candidate = self._string(self._tokens[base], self._tokens[base + 1])
+            if candidate < token:
+                low = middle + 1
+            elif candidate > token:
+                high = middle
+            else:
+                start = self._tokens[base + 2]
+                return self._postings[start:start + self._tokens[base + 3]]
+        return ()
+
+    def _fingerprint_position(self, digest):
+        low, high = 0, self._n_fingerprints
+        while low < high:
+            middle = (low + high) // 2
+            start = self._fingerprint_keys + middle * FINGERPRINT_BYTES
+            candidate = self._map[start:start + FINGERPRINT_BYTES]
+            if candidate < digest:
+                low = middle + 1
+            elif candidate > digest:
+                high = middle
+            else:
+                return self._fingerprint_positions[middle]
+        return None
+
+    def best_match(self, question):
+        tokens = question_tokens(question)
+        form_words = set(tokens)
+
+        if tokens:
+            position = self._fingerprint_position(bytes.fromhex(question_fingerprint(tokens)))
+            if position is not None:
+                return self.entry(position), 1.0
+
+        common_counts = {}
+        for word in form_words:
+            for position in self._postings_for(word.encode('utf-8')):
+                common_counts[position] = common_counts.get(position, 0) + 1
+
+        best_position = None
+        best_match_score = 0
+        for position in sorted(common_counts):
+            match_score = overlap_score(common_counts[position], len(form_words), self._entry_size(position))
+            if match_score > best_match_score:
+                best_match_score = match_score
+                best_position = position
+
+        if best_position is None:
+            return None, best_match_score
+        return self.entry(best_position), best_match_score
+
+    def best_matches(self, texts):
+        return [self.best_match(text) for text in texts]
+
+
+class IndexStore:
+    # Index files live under <directory>/<sha1(uid)>/<kb_version>.idx. The
+    # name is derived from the knowledge base content, so any worker that
+    # sees the same knowledge base maps the same file.
+    def __init__(self, directory, keep_versions=KEEP_VERSIONS):
+        self.directory = directory
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()
+
+    def _user_dir(self, uid):
+        return os.path.join(self.directory, hashlib.sha1(uid.encode('utf-8')).hexdigest())
+
+    def path(self, uid, kb_version):
+        return os.path.join(self._user_dir(uid), f'{kb_version}.idx')
+
+    def load(self, uid, qa_list, kb_version):
+        # Maps the index for this version, writing it first if no worker
+        # has yet. Falls back to an in-process index if the file can't be
+        # used, so a bad disk never breaks matching.
+        path = self.path(uid, kb_version)
+        try:
+            try:
+                return MappedIndex(path, kb_version)
+            except (FileNotFoundError, InvalidIndexFile):
+                self.write(uid, qa_list, kb_version)
+                # Writers don't always publish (see app.publish_knowledge_base),
+                # so readers keep old versions bounded too
+                self._prune(uid)
+                return MappedIndex(path, kb_version)
+        except Exception as e:
+            logger.warning("Using an in-process index for user %s: %s", uid, e)
+            return MatchIndex(qa_list)
+
+    def publish(self, uid, qa_list, kb_version):
+        # Called after a write: puts the new version in place and removes
+        # all but the newest `keep_versions` files
+        try:
+            if not os.path.exists(self.path(uid, kb_version)):
+                self.write(uid, qa_list, kb_version)
+            self._prune(uid)
+        except OSError as e:
+            logger.warning("Could not publish index for user %s: %s", uid, e)
+
+    def write(self, uid, qa_list, kb_version):
+        user_dir = self._user_dir(uid)
+        os.makedirs(user_dir, exist_ok=True)
+        data = encode_index(qa_list, kb_version)
+        fd, temp_path = tempfile.mkstemp(dir=user_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            # Atomic on POSIX: readers see the old state or the whole file.
+            # Workers that already mapped a replaced or removed file keep
+            # their mapping.
+            os.replace(temp_path, self.path(uid, kb_version))
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def _prune(self, uid):
+        user_dir = self._user_dir(uid)
+        with self._lock:
+            # Other workers may prune the same directory concurrently
+            files = []
+            for name in os.listdir(user_dir):
+                if name.endswith('.idx'):
+                    path = os.path.join(user_dir, name)
+                    try:
+                        files.append((os.path.getmtime(path), path))
+                    except FileNotFoundError:
+                        pass
+            files.sort(reverse=True)
+            for _, path in files[self.keep_versions:]:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,175 @@
+"""In-process cache of each user's knowledge base.
+
+Entries are kept in an LRU bounded by user count and approximate byte size,
+and expire after a TTL. The Q&A handlers write through to the cache so a
+user's own edits are visible immediately in this process; other processes
+pick them up once their copy expires. Each entry remembers when it was
+loaded from storage, so sync listings served from it can tell clients
+which later writes they may not have seen.
+"""
+import bisect
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Rough per-item overhead for the dict and its keys, on top of string sizes
+ITEM_OVERHEAD_BYTES = 200
+
+
+def estimate_size(qa_list):
+    size = 0
+    for qa in qa_list:
+        size += ITEM_OVERHEAD_BYTES
+        size += len(qa.get('question', '')) + len(qa.get('answer', ''))
+    return size
+
+
+def knowledge_base_version(qa_list):
+    # Content hash of the user's Q&A pairs. Identical knowledge bases get the
+    # same version in every process, so it is safe to use in shared keys.
+    digest = hashlib.sha1()
+    for qa in qa_list:
+        for value in (qa['id'], qa.get('question', ''), qa.get('answer', '')):
+            digest.update(value.encode('utf-8'))
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class KnowledgeBaseCache:
+    def __init__(self, loader, ttl_seconds=300, max_users=1000,
+                 max_bytes=64 * 1024 * 1024, clock=time.monotonic, wall_clock=time.time):
+        # loader(uid) returns the user's Q&A items as dicts with an 'id' key,
+        # in the backend's natural (document id) order
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.wall_clock = wall_clock
+
+        # uid -> (expires_at, qa_list, size, version, loaded_at); loaded_at is
+        # wall-clock time taken just before the storage read
+        self._entries = OrderedDict()
+        # Bumped on every write so a load that raced with a write is not cached
+        self._generations = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, uid):
+        # The returned list is shared with the cache and must not be mutated
+        return self.get_with_version(uid)[0]
+
+    def get_with_version(self, uid):
+        return self.get_with_load_time(uid)[:2]
+
+    def get_with_load_time(self, uid):
+        # (qa_list, version, loaded_at): the list holds every write made
+        # before loaded_at (epoch seconds), plus this process's own writes
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(uid)
+                self.hits += 1
+                return entry[1], entry[3], entry[4]
+            if entry:
+                self._drop(uid)
+            self.misses += 1
+            generation = self._generations.get(uid, 0)
+
+        loaded_at = self.wall_clock()
+        qa_list = self.loader(uid)
+        version = knowledge_base_version(qa_list)
+        with self._lock:
+            if self._generations.get(uid, 0) == generation:
+                self._drop(uid)
+                self._insert(uid, self.clock() + self.ttl_seconds, qa_list, version, loaded_at)
+        return qa_list, version, loaded_at
+
+    def peek_with_version(self, uid):
+        # (qa_list, version) if the user's knowledge base is cached and
+        # fresh, else None; never loads and doesn't count as a hit or miss
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry and entry[0] > self.clock():
+                return entry[1], entry[3]
+            return None
+
+    def invalidate(self, uid):
+        with self._lock:
+            self._bump(uid)
+            self._drop(uid)
+
+    def add_item(self, uid, item):
+        def apply(qa_list):
+            ids = [qa['id'] for qa in qa_list]
+            position = bisect.bisect_left(ids, item['id'])
+            return qa_list[:position] + [item] + qa_list[position:]
+        self._write_through(uid, apply)
+
+    def add_items(self, uid, items):
+        def apply(qa_list):
+            return sorted(qa_list + list(items), key=lambda qa: qa['id'])
+        self._write_through(uid, apply)
+
+    def update_item(self, uid, item):
+        def apply(qa_list):
+            if not any(qa['id'] == item['id'] for qa in qa_list):
+                return None
+            return [{**qa, **item} if qa['id'] == item['id'] else qa for qa in qa_list]
+        self._write_through(uid, apply)
+
+    def remove_item(self, uid, qa_id):
+        def apply(qa_list):
+            return [qa for qa in qa_list if qa['id'] != qa_id]
+        self._write_through(uid, apply)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'users': len(self._entries),
+                'bytes': self._total_bytes
+            }
+
+    def _write_through(self, uid, apply):
+        # Copy-on-write: readers may still be iterating the old list. If the
+        # change can't be applied to the cached copy, fall back to a reload.
+        with self._lock:
+            self._bump(uid)
+            entry = self._entries.get(uid)
+            if not entry:
+                return
+            qa_list = apply(entry[1])
+            if qa_list is None:
+                self._drop(uid)
+                return
+            self._drop(uid)
+            # Still only complete up to the original load for other writers
+            self._insert(uid, entry[0], qa_list, knowledge_base_version(qa_list), entry[4])
+
+    def _insert(self, uid, expires_at, qa_list, version, loaded_at):
+        size = estimate_size(qa_list)
+        if size > self.max_bytes:
+            return
+        self._entries[uid] = (expires_at, qa_list, size, version, loaded_at)
+        self._total_bytes += size
+        while len(self._entries) > self.max_users or self._total_bytes > self.max_bytes:
+            oldest_uid = next(iter(self._entries))
+            self._drop(oldest_uid)
+            self.evictions += 1
+
+    def _bump(self, uid):
+        self._generations[uid] = self._generations.get(uid, 0) + 1
+
+    def _drop(self, uid):
+        entry = self._entries.pop(uid, None)
+        if entry:
+            self._total_bytes -= entry[2]
@@ -0,0 +1,179 @@
+"""Question matching for /api/process-form.
+
+The default 'overlap' engine compiles the knowledge base into an inverted
+index (token -> entry positions) so each form question is only scored
+against entries that share at least one token with it. Tokens are the
+canonical question tokens from features, read from each stored item when
+precomputed. The 'tfidf' engine lives in tfidf_matcher and is imported on
+first use.
+"""
+import threading
+from collections import OrderedDict, defaultdict
+
+from features import FEATURES_VERSION, question_fingerprint, question_tokens, stored_tokens
+
+# Minimum word-overlap score for a knowledge-base entry to count as a match
+MATCH_THRESHOLD = 0.3
+
+MATCH_ENGINES = ('overlap', 'tfidf')
+
+
+def tokenize(text):
+    return set(question_tokens(text))
+
+
+def normalize_question(question):
+    return ' '.join(question.lower().split())
+
+
+def overlap_score(common, form_size, qa_size):
+    return common / max(form_size, qa_size)
+
+
+class MatchIndex:
+    default_threshold = MATCH_THRESHOLD
+
+    def __init__(self, qa_list):
+        self.entries = list(qa_list)
+        self.entry_sizes = []
+        self.postings = defaultdict(list)
+        # Fingerprint -> first entry with exactly that token set
+        self.fingerprints = {}
+
+        # Postings are appended in knowledge-base order, so every list is
+        # sorted by entry position
+        for position, qa in enumerate(self.entries):
+            words = stored_tokens(qa)
+            self.entry_sizes.append(len(words))
+            for word in words:
+                self.postings[word].append(position)
+
+            if qa.get('question_features_version') == FEATURES_VERSION and 'question_fingerprint' in qa:
+                fingerprint = qa['question_fingerprint']
+            else:
+                fingerprint = question_fingerprint(words)
+            if words:
+                self.fingerprints.setdefault(fingerprint, position)
+
+    def best_match(self, question):
+        tokens = question_tokens(question)
+        form_words = set(tokens)
+
+        # Identical token sets score 1.0, and the first such entry is what
+        # the scan below would pick, so answer it from the fingerprint map
+        if tokens:
+            position = self.fingerprints.get(question_fingerprint(tokens))
+            if position is not None:
+                return self.entries[position], 1.0
+
+        # Count shared words per candidate entry
+        common_counts = defaultdict(int)
+        for word in form_words:
+            for position in self.postings.get(word, ()):
+                common_counts[position] += 1
+
+        matching_qa = None
+        best_match_score = 0
+        # Visit candidates in knowledge-base order so ties resolve to the
+        # earliest entry, same as a linear scan would
+        for position in sorted(common_counts):
+            match_score = overlap_score(
+                common_counts[position], len(form_words), self.entry_sizes[position]
+            )
+            if match_score > best_match_score:
+                best_match_score = match_score
+                matching_qa = self.entries[position]
+
+        return matching_qa, best_match_score
+
+    def best_matches(self, texts):
+        return [self.best_match(text) for text in texts]
+
+
+def get_index_class(engine):
+    if engine == 'overlap':
+        return MatchIndex
+    if engine == 'tfidf':
+        from tfidf_matcher import TfidfIndex
+        return TfidfIndex
+    raise ValueError(f"Unknown match engine: {engine}")
+
+
+def build_index(qa_list, engine='overlap'):
+    return get_index_class(engine)(qa_list)
+
+
+class IndexCache:
+    # Compiled indexes keyed by (uid, engine). An index stays valid for as
+    # long as the knowledge base cache hands out the same list object, which
+    # it replaces on every write or reload. With a `store` (see index_store),
+    # 'overlap' indexes are memory-mapped from files shared by all workers
+    # instead of being built in each process.
+    def __init__(self, max_size=256, store=None):
+        self.max_size = max_size
+        self.store = store
+        self._entries = OrderedDict()  # (uid, engine) -> (qa_list, index)
+        self._lock = threading.Lock()
+
+    def get(self, uid, qa_list, engine='overlap', kb_version=None):
+        key = (uid, engine)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] is qa_list:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        if self.store is not None and engine == 'overlap' and kb_version:
+            index = self.store.load(uid, qa_list, kb_version)
+        else:
+            index = build_index(qa_list, engine)
+        with self._lock:
+            self._entries[key] = (qa_list, index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return index
+
+
+def build_answer(question, matching_qa, match_score):
+    return {
+        'question': question['question'],
+        'answer': matching_qa['answer'],
+        'matched_question': matching_qa['question'],
+        'match_score': match_score
+    }
+
+
+def iter_matches(questions, index, threshold=None):
+    # Yields (position, answer) for every question with a good enough match
+    if threshold is None:
+        threshold = index.default_threshold
+
+    matches = index.best_matches([question['question'] for question in questions])
+    for position, (question, (matching_qa, best_match_score)) in enumerate(zip(questions, matches)):
+        if matching_qa and best_match_score >= threshold:
+            yield position, build_answer(question, matching_qa, best_match_score)
+
+
+def match_questions_brute_force(questions, qa_list, threshold=MATCH_THRESHOLD):
+    # Reference all-pairs implementation, kept for equivalence checks and
+    # benchmarks against the indexed matcher
+    answers = []
+    for question in questions:
+        form_words = tokenize(question['question'])
+
+        matching_qa = None
+        best_match_score = 0
+        for qa in qa_list:
+            qa_words = tokenize(qa.get('question', ''))
+            if not form_words and not qa_words:
+                continue
+            common_words = form_words.intersection(qa_words)
+            match_score = overlap_score(len(common_words), len(form_words), len(qa_words))
+            if match_score > best_match_score:
+                best_match_score = match_score
+                matching_qa = qa
+
+        if matching_qa and best_match_score >= threshold:
+            answers.append(build_answer(question, matching_qa, best_match_score))
+    return answers
@@ -0,0 +1,100 @@
+"""Latency histograms exported in the Prometheus text format.
+
+Each histogram has a single label (e.g. `stage` or `endpoint`). Values are
+per process; under gunicorn every worker reports its own series.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    def __init__(self, name, documentation, label_name, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_name = label_name
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}  # label value -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, seconds):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[0][position] += 1
+                    break
+            series[1] += seconds
+            series[2] += 1
+
+    @contextmanager
+    def time(self, label_value):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - start)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram"
+        ]
+        with self._lock:
+            series = {label: (list(counts), total, count)
+                      for label, (counts, total, count) in self._series.items()}
+
+        for label_value in sorted(series):
+            counts, total, count = series[label_value]
+            label = f'{self.label_name}="{escape_label(label_value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{format_value(bound)}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {format_value(total)}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return lines
+
+
+# Time spent in each stage of request handling (auth_decode, user_fetch,
+# kb_load, matching, fallback, serialization)
+stage_seconds = Histogram(
+    'formmate_stage_duration_seconds',
+    'Time spent in each request handling stage.',
+    'stage'
+)
+
+# End-to-end handler time per Flask endpoint
+request_seconds = Histogram(
+    'formmate_request_duration_seconds',
+    'Time spent handling each request, by endpoint.',
+    'endpoint'
+)
+
+
+def render_metrics(histograms, counters=None, gauges=None):
+    # counters and gauges: {name: (documentation, value)}
+    lines = []
+    for histogram in histograms:
+        lines.extend(histogram.render())
+    for metric_type, samples in (('counter', counters), ('gauge', gauges)):
+        for name, (documentation, value) in sorted((samples or {}).items()):
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {format_value(value)}")
+    return '\n'.join(lines) + '\n'
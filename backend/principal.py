@@ -0,0 +1,58 @@
+"""Authenticated user built from JWT claims.
+
+Handlers receive a CurrentUser instead of a Firestore snapshot. `id` and
+the token claims (e.g. `email`) are available without any I/O; the user
+document is only fetched the first time a handler asks for a field that
+isn't in the token.
+"""
+import threading
+
+from metrics import stage_seconds
+
+
+class CurrentUser:
+    def __init__(self, uid, claims, storage):
+        self.id = uid
+        self.claims = claims
+        self.storage = storage
+        self._document = None
+        self._fetched = False
+
+    @property
+    def document(self):
+        if not self._fetched:
+            with stage_seconds.time('user_fetch'):
+                self._document = self.storage.get_user(self.id)
+            self._fetched = True
+        return self._document
+
+    @property
+    def exists(self):
+        return self.document is not None
+
+    def get(self, field):
+        # Same access pattern as DocumentSnapshot.get, claims first
+        if field in self.claims:
+            return self.claims[field]
+        if self.document is None:
+            raise KeyError(field)
+        return self.document[field]
+
+
+class KnownUsers:
+    # uids whose user document is known to exist in this process. Bounded so
+    # a long-running worker doesn't grow without limit; forgetting a uid only
+    # costs one extra existence check.
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._uids = set()
+        self._lock = threading.Lock()
+
+    def __contains__(self, uid):
+        return uid in self._uids
+
+    def add(self, uid):
+        with self._lock:
+            if len(self._uids) >= self.max_size:
+                self._uids.clear()
+            self._uids.add(uid)
\ No newline at end of file
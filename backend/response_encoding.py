@@ -0,0 +1,132 @@
+"""Compact response encodings: MessagePack bodies and gzip/brotli.
+
+MessagePack is used when a client asks for it with
+`Accept: application/msgpack` (or sends a msgpack request body), and only
+if the msgpack package is installed. Compression is negotiated from
+Accept-Encoding: brotli when the client accepts it and the brotli package
+is installed, otherwise gzip. Bodies smaller than the threshold are sent
+as they are, since compressing them costs more than it saves.
+"""
+import gzip
+import zlib
+
+from flask import Response, jsonify
+
+from metrics import stage_seconds
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+COMPRESSIBLE_MIMETYPES = frozenset((
+    'application/json', MSGPACK_MIMETYPE, 'application/x-ndjson', 'text/csv', 'text/plain'
+))
+
+
+def pack(payload):
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def unpack(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+def wants_msgpack(request):
+    if msgpack is None:
+        return False
+    return request.accept_mimetypes.best_match(('application/json', MSGPACK_MIMETYPE)) == MSGPACK_MIMETYPE
+
+
+def read_body(request):
+    # Request JSON, or msgpack when the client sent that
+    if request.mimetype == MSGPACK_MIMETYPE and msgpack is not None:
+        return unpack(request.get_data())
+    return request.get_json()
+
+
+def encode_response(payload, use_msgpack, status=200):
+    if use_msgpack:
+        response = Response(pack(payload), status=status, mimetype=MSGPACK_MIMETYPE)
+    else:
+        response = jsonify(payload)
+        response.status_code = status
+    # The representation depends on Accept, so caches must key on it
+    response.vary.add('Accept')
+    return response
+
+
+class Compressor:
+    def __init__(self, min_size=1024, gzip_level=4, brotli_quality=4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose(self, request):
+        # 'br', 'gzip' or None, by the client's preference and what is
+        # available; ties go to brotli
+        accepted = request.accept_encodings
+        options = ['gzip']
+        if brotli is not None:
+            options.insert(0, 'br')
+        best = None
+        best_quality = 0
+        for encoding in options:
+            quality = accepted[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level)
+
+    def compress_stream(self, chunks, encoding):
+        # For streamed bodies (e.g. export): compressed incrementally, with
+        # no size threshold since the size isn't known up front
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            for chunk in chunks:
+                data = compressor.process(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                if data:
+                    yield data
+            yield compressor.finish()
+        else:
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)  # 31: gzip container
+            for chunk in chunks:
+                data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+
+    def __call__(self, request, response):
+        # after_request hook for buffered responses
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        encoding = self.choose(request)
+        if encoding is None:
+            return response
+
+        with stage_seconds.time('compression'):
+            response.set_data(self.compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        # A compressed body is a different representation; a weak ETag still
+        # matches If-None-Match
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,105 @@
+"""Lazily initialized external services: Firebase, Firestore and Gemini.
+
+Importing the Firebase Admin SDK and google.generativeai and building the
+clients takes seconds, so nothing here runs at import time. Each service
+is wrapped in a Lazy that builds it on first use, once per process, even
+when several request threads get there at the same time. A service that
+fails to start raises ServiceUnavailable and is retried on the next use,
+so a missing Firebase key only breaks the routes that need Firebase.
+"""
+import os
+import threading
+
+from storage import FirestoreStorage, MemoryStorage
+
+_UNSET = object()
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+class Lazy:
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = _UNSET
+        self._lock = threading.Lock()
+
+    def get(self):
+        value = self._value
+        if value is not _UNSET:
+            return value
+        with self._lock:
+            if self._value is _UNSET:
+                # Exceptions propagate and leave the value unset, so the
+                # next call tries again
+                self._value = self._factory()
+            return self._value
+
+    def peek(self, default=None):
+        # The value if it has been built, without building it
+        value = self._value
+        return default if value is _UNSET else value
+
+    def __getattr__(self, name):
+        # Lets a Lazy stand in for the object it wraps (e.g. storage.list_qa)
+        return getattr(self.get(), name)
+
+
+def firebase_credentials():
+    private_key = os.getenv('FIREBASE_PRIVATE_KEY')
+    if not private_key:
+        raise ServiceUnavailable("FIREBASE_PRIVATE_KEY is not set in environment variables")
+
+    from firebase_admin import credentials
+    return credentials.Certificate({
+        "type": "service_account",
+        "project_id": os.getenv('FIREBASE_PROJECT_ID'),
+        "private_key_id": os.getenv('FIREBASE_PRIVATE_KEY_ID'),
+        "private_key": private_key.replace('\\n', '\n'),
+        "client_email": os.getenv('FIREBASE_CLIENT_EMAIL'),
+        "client_id": os.getenv('FIREBASE_CLIENT_ID'),
+        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+        "client_x509_cert_url": os.getenv('FIREBASE_CLIENT_CERT_URL')
+    })
+
+
+def init_firebase_app(logger):
+    logger.info("Initializing Firebase Admin SDK...")
+    try:
+        import firebase_admin
+        firebase_app = firebase_admin.initialize_app(firebase_credentials())
+    except Exception as e:
+        logger.error("Error initializing Firebase: %s", e)
+        raise ServiceUnavailable(f"Firebase is unavailable: {e}") from e
+    logger.info("Firebase Admin SDK initialized for project %s", os.getenv('FIREBASE_PROJECT_ID'))
+    return firebase_app
+
+
+def init_storage(backend, firebase_app, logger):
+    if backend == 'memory':
+        logger.warning("Using in-memory storage; data is lost on restart")
+        return MemoryStorage()
+
+    app = firebase_app.get()
+    try:
+        from firebase_admin import firestore
+        return FirestoreStorage(firestore.client(app))
+    except Exception as e:
+        logger.error("Error creating Firestore client: %s", e)
+        raise ServiceUnavailable(f"Firestore is unavailable: {e}") from e
+
+
+def init_gemini_model(api_key, model_name, logger):
+    # Returns None when no key is configured; form processing then runs
+    # without the model fallback
+    if not api_key:
+        logger.warning("GEMINI_API_KEY is not set")
+        return None
+
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    logger.info("Gemini API key initialized")
+    return genai.GenerativeModel(model_name)
@@ -0,0 +1,183 @@
+"""Storage backends for users and their knowledge bases.
+
+FirestoreStorage is what production runs on. MemoryStorage keeps
+everything in process and is meant for local development, benchmarks and
+load tests (STORAGE_BACKEND=memory). Both return Q&A items as plain dicts
+with an 'id' key, ordered by id the way Firestore streams them.
+
+Deletes leave a tombstone ({'id', 'deleted_at'}) so delta syncs can report
+them.
+"""
+import copy
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from sync import changed_since, to_utc
+
+# Firestore rejects write batches with more than 500 operations
+FIRESTORE_BATCH_LIMIT = 500
+
+
+class NotFound(Exception):
+    pass
+
+
+class FirestoreStorage:
+    def __init__(self, db):
+        self.db = db
+
+    def _user_ref(self, uid):
+        return self.db.collection('users').document(uid)
+
+    def _kb_ref(self, uid):
+        return self._user_ref(uid).collection('knowledge_base')
+
+    def _tombstones_ref(self, uid):
+        return self._user_ref(uid).collection('knowledge_base_deleted')
+
+    def iter_user_ids(self):
+        for user in self.db.collection('users').stream():
+            yield user.id
+
+    def get_user(self, uid):
+        snapshot = self._user_ref(uid).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def create_user(self, uid, data):
+        self._user_ref(uid).set(data)
+
+    def list_qa(self, uid):
+        return list(self.iter_qa(uid))
+
+    def iter_qa(self, uid):
+        for qa in self._kb_ref(uid).stream():
+            yield {'id': qa.id, **qa.to_dict()}
+
+    def add_qa(self, uid, data):
+        return self._kb_ref(uid).add(data)[1].id
+
+    def add_qa_batch(self, uid, items):
+        # Commits in chunks that fit in one Firestore write batch. A failure
+        # part-way leaves earlier chunks committed.
+        kb_ref = self._kb_ref(uid)
+        ids = []
+        for start in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for data in items[start:start + FIRESTORE_BATCH_LIMIT]:
+                doc_ref = kb_ref.document()
+                batch.set(doc_ref, data)
+                ids.append(doc_ref.id)
+            batch.commit()
+        return ids
+
+    def update_qa_batch(self, uid, updates):
+        # updates: list of (qa_id, data), committed in Firestore-sized batches
+        kb_ref = self._kb_ref(uid)
+        for start in range(0, len(updates), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for qa_id, data in updates[start:start + FIRESTORE_BATCH_LIMIT]:
+                batch.update(kb_ref.document(qa_id), data)
+            batch.commit()
+
+    def update_qa(self, uid, qa_id, data):
+        from google.api_core.exceptions import NotFound as FirestoreNotFound
+        try:
+            self._kb_ref(uid).document(qa_id).update(data)
+        except FirestoreNotFound:
+            raise NotFound(qa_id)
+
+    def delete_qa(self, uid, qa_id):
+        batch = self.db.batch()
+        batch.delete(self._kb_ref(uid).document(qa_id))
+        batch.set(self._tombstones_ref(uid).document(qa_id), {'deleted_at': datetime.now(timezone.utc)})
+        batch.commit()
+
+    def list_qa_changed_since(self, uid, since):
+        # Firestore can't OR two range filters, so run one query per field
+        changed = {}
+        for field in ('created_at', 'updated_at'):
+            for qa in self._kb_ref(uid).where(field, '>', since).stream():
+                changed[qa.id] = {'id': qa.id, **qa.to_dict()}
+        return [changed[qa_id] for qa_id in sorted(changed)]
+
+    def list_deleted_since(self, uid, since):
+        query = self._tombstones_ref(uid).where('deleted_at', '>', since)
+        return sorted(
+            ({'id': doc.id, **doc.to_dict()} for doc in query.stream()),
+            key=lambda tombstone: tombstone['id']
+        )
+
+
+class MemoryStorage:
+    def __init__(self):
+        self._users = {}
+        self._knowledge_bases = {}  # uid -> {qa_id: data}
+        self._tombstones = {}  # uid -> {qa_id: deleted_at}
+        self._lock = threading.Lock()
+
+    def iter_user_ids(self):
+        with self._lock:
+            return iter(list(self._users))
+
+    def get_user(self, uid):
+        with self._lock:
+            user = self._users.get(uid)
+            return copy.deepcopy(user) if user is not None else None
+
+    def create_user(self, uid, data):
+        with self._lock:
+            self._users[uid] = copy.deepcopy(data)
+
+    def list_qa(self, uid):
+        with self._lock:
+            items = self._knowledge_bases.get(uid, {})
+            return [{'id': qa_id, **items[qa_id]} for qa_id in sorted(items)]
+
+    def iter_qa(self, uid):
+        return iter(self.list_qa(uid))
+
+    def add_qa(self, uid, data):
+        qa_id = uuid.uuid4().hex
+        with self._lock:
+            self._knowledge_bases.setdefault(uid, {})[qa_id] = dict(data)
+        return qa_id
+
+    def add_qa_batch(self, uid, items):
+        ids = [uuid.uuid4().hex for _ in items]
+        with self._lock:
+            knowledge_base = self._knowledge_bases.setdefault(uid, {})
+            for qa_id, data in zip(ids, items):
+                knowledge_base[qa_id] = dict(data)
+        return ids
+
+    def update_qa_batch(self, uid, updates):
+        with self._lock:
+            items = self._knowledge_bases.get(uid, {})
+            for qa_id, data in updates:
+                if qa_id in items:
+                    items[qa_id].update(data)
+
+    def update_qa(self, uid, qa_id, data):
+        with self._lock:
+            items = self._knowledge_bases.get(uid, {})
+            if qa_id not in items:
+                raise NotFound(qa_id)
+            items[qa_id].update(data)
+
+    def delete_qa(self, uid, qa_id):
+        with self._lock:
+            self._knowledge_bases.get(uid, {}).pop(qa_id, None)
+            self._tombstones.setdefault(uid, {})[qa_id] = datetime.now(timezone.utc)
+
+    def list_qa_changed_since(self, uid, since):
+        return [qa for qa in self.list_qa(uid) if changed_since(qa, since)]
+
+    def list_deleted_since(self, uid, since):
+        with self._lock:
+            tombstones = self._tombstones.get(uid, {})
+            return [
+                {'id': qa_id, 'deleted_at': tombstones[qa_id]}
+                for qa_id in sorted(tombstones)
+                if to_utc(tombstones[qa_id]) > since
+            ]
@@ -0,0 +1,72 @@
+"""Helpers for paginated and delta (since=) listings of /api/qa."""
+import bisect
+from datetime import datetime, timedelta, timezone
+
+# Largest page a client can ask for with ?limit=
+MAX_PAGE_SIZE = 1000
+
+# Writes stamp their time before the storage commit lands, so the time
+# handed back for the next ?since= is moved back by this much. Clients
+# may see a few items twice but never miss one.
+SYNC_LAG = timedelta(seconds=5)
+
+
+def to_utc(value):
+    # Timestamps are written as aware UTC datetimes, and Firestore always
+    # returns aware ones. A naive value can only be a legacy stamp from
+    # datetime.now() in the memory backend, i.e. server local time, which
+    # astimezone() reads it as.
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc)
+
+
+def parse_since(value):
+    # Accepts ISO 8601 (as returned in server_time) or epoch seconds
+    try:
+        return datetime.fromtimestamp(float(value), timezone.utc)
+    except ValueError:
+        pass
+    except (OverflowError, OSError) as e:
+        # Out of range (1e20, inf): a bad value, not a server error
+        raise ValueError(f"Invalid since: {value}") from e
+    since = datetime.fromisoformat(value)
+    # A client-supplied time without an offset is taken as UTC
+    if since.tzinfo is None:
+        return since.replace(tzinfo=timezone.utc)
+    return since.astimezone(timezone.utc)
+
+
+def parse_limit(value):
+    if value is None:
+        return MAX_PAGE_SIZE
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+
+def sync_time(now=None):
+    now = now or datetime.now(timezone.utc)
+    return (now - SYNC_LAG).isoformat()
+
+
+def changed_since(qa, since):
+    for field in ('created_at', 'updated_at'):
+        value = qa.get(field)
+        if isinstance(value, datetime) and to_utc(value) > since:
+            return True
+    return False
+
+
+def paginate(qa_list, cursor, limit):
+    # qa_list is sorted by id; the cursor is the last id of the previous page
+    start = bisect.bisect_right([qa['id'] for qa in qa_list], cursor) if cursor else 0
+    page = qa_list[start:start + limit]
+    next_cursor = page[-1]['id'] if start + limit < len(qa_list) else None
+    return page, next_cursor
+
+
+def public_item(qa):
+    return {
+        'id': qa['id'],
+        'question': qa.get('question', ''),
+        'answer': qa.get('answer', '')
+    }
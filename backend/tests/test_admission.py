@@ -0,0 +1,148 @@
+"""SingleFlight coalescing, error propagation and gate release."""
+import threading
+
+import pytest
+
+from admission import ConcurrencyGate, RateLimiter, SingleFlight
+
+
+class Items:
+    # An item source that records how far it was consumed
+    def __init__(self, values, error=None):
+        self.values = values
+        self.error = error
+        self.produced = 0
+
+    def __iter__(self):
+        for value in self.values:
+            self.produced += 1
+            yield value
+        if self.error is not None:
+            raise self.error
+
+
+def start(flights, key='k', items=None, gate=None):
+    flight, leader = flights.join(key, admit=gate.try_enter if gate else None)
+    assert leader
+    return flights.lead(key, flight, items if items is not None else Items([1, 2, 3]),
+                        on_done=gate.exit if gate else None)
+
+
+def test_followers_get_the_leaders_items():
+    flights = SingleFlight()
+    leader = start(flights)
+    follower, is_leader = flights.join('k')
+    assert not is_leader
+    assert flights.coalesced == 1
+
+    assert list(leader) == [1, 2, 3]
+    assert list(follower) == [1, 2, 3]
+    # The finished flight is released; the next request leads again
+    assert flights.join('k')[1]
+
+
+def test_followers_receive_items_while_the_leader_runs():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def items():
+        yield 1
+        assert release.wait(5)
+        yield 2
+
+    leader = start(flights, items=items())
+    follower, _ = flights.join('k')
+    received = []
+    reader = threading.Thread(target=lambda: received.extend(follower))
+    reader.start()
+
+    assert next(leader) == 1
+    release.set()
+    assert list(leader) == [2]
+    reader.join(5)
+    assert received == [1, 2]
+
+
+def test_errors_reach_followers():
+    flights = SingleFlight()
+    leader = start(flights, items=Items([1], error=RuntimeError('storage down')))
+    follower, _ = flights.join('k')
+
+    with pytest.raises(RuntimeError, match='storage down'):
+        list(leader)
+    with pytest.raises(RuntimeError, match='storage down'):
+        list(follower)
+    assert flights.join('k')[1]
+
+
+def test_abandoned_flight_fails_followers_and_is_released():
+    flights = SingleFlight()
+    flight, _ = flights.join('k')
+    follower, _ = flights.join('k')
+
+    flights.abandon('k', flight, RuntimeError('load failed'))
+    with pytest.raises(RuntimeError, match='load failed'):
+        list(follower)
+    assert flights.join('k')[1]
+
+
+def test_refused_admission_registers_nothing():
+    flights = SingleFlight()
+    assert flights.join('k', admit=lambda: False) == (None, False)
+    assert flights.join('k', admit=lambda: True)[1]
+
+
+def test_closing_an_unfollowed_flight_stops_the_work_and_frees_the_gate():
+    flights = SingleFlight()
+    gate = ConcurrencyGate(1)
+    items = Items([1, 2, 3])
+    leader = start(flights, items=items, gate=gate)
+    assert gate.active == 1
+    # Full while the flight runs
+    assert flights.join('other', admit=gate.try_enter) == (None, False)
+
+    assert next(leader) == 1
+    leader.close()
+    assert items.produced == 1
+    assert gate.active == 0
+    assert flights.join('k')[1]
+
+
+def test_closing_a_followed_flight_finishes_it_for_the_followers():
+    flights = SingleFlight()
+    gate = ConcurrencyGate(1)
+    items = Items([1, 2, 3])
+    leader = start(flights, items=items, gate=gate)
+    follower, _ = flights.join('k')
+
+    assert next(leader) == 1
+    leader.close()
+    assert list(follower) == [1, 2, 3]
+    assert gate.active == 0
+
+
+def test_closing_before_iterating_still_serves_followers():
+    # A streamed response can be closed before its body is ever read
+    flights = SingleFlight()
+    gate = ConcurrencyGate(1)
+    leader = start(flights, gate=gate)
+    follower, _ = flights.join('k')
+
+    leader.close()
+    assert list(follower) == [1, 2, 3]
+    assert gate.active == 0
+
+
+def test_rate_limiter_refills_over_time():
+    now = [0.0]
+    limiter = RateLimiter(rate=2, burst=2, clock=lambda: now[0])
+
+    assert limiter.acquire('u') == 0
+    assert limiter.acquire('u') == 0
+    assert limiter.acquire('u') == pytest.approx(0.5)
+    # Other users have their own bucket
+    assert limiter.acquire('v') == 0
+
+    now[0] += 0.5
+    assert limiter.acquire('u') == 0
+    assert limiter.rejected == 1
@@ -0,0 +1,120 @@
+"""FallbackAnswerer budget, shedding and caching, with a fake model."""
+import json
+import threading
+import time
+
+import pytest
+
+from fallback import FallbackAnswerer, parse_response
+
+QA_LIST = [{'id': '1', 'question': 'Full name', 'answer': 'Ada Lovelace'}]
+
+
+class FakeModel:
+    # Replies with `reply(questions)`; with `gate` set, each call blocks
+    # until the gate is opened
+    def __init__(self, reply, gate=None):
+        self.reply = reply
+        self.gate = gate
+        self.prompts = []
+
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        if self.gate is not None:
+            assert self.gate.wait(5)
+        return self.reply(prompt)
+
+
+def answer_all(prompt):
+    fields = [line for line in prompt.split('Form fields:\n')[1].splitlines() if line[:1].isdigit()]
+    return json.dumps({line.split('.')[0]: f'answer {line.split(". ", 1)[1]}' for line in fields})
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_answers_are_cached_per_question_and_version():
+    model = FakeModel(answer_all)
+    answerer = FallbackAnswerer(model)
+
+    assert answerer.answer('u', ['City', 'Degree'], QA_LIST, 'v1') == {
+        'City': 'answer City', 'Degree': 'answer Degree'
+    }
+    # Cached, also under a different spelling of the same question
+    assert answerer.answer('u', ['city ', 'Degree'], QA_LIST, 'v1') == {
+        'city ': 'answer City', 'Degree': 'answer Degree'
+    }
+    assert len(model.prompts) == 1
+
+    # A new knowledge base version asks again
+    answerer.answer('u', ['City'], QA_LIST, 'v2')
+    assert len(model.prompts) == 2
+    assert answerer.stats()['hits'] == 2
+
+
+def test_null_answers_are_cached():
+    model = FakeModel(lambda prompt: '```json\n{"1": null, "2": "Paris"}\n```')
+    answerer = FallbackAnswerer(model)
+
+    assert answerer.answer('u', ['Salary', 'City'], QA_LIST, 'v1') == {'City': 'Paris'}
+    assert answerer.answer('u', ['Salary'], QA_LIST, 'v1') == {}
+    assert len(model.prompts) == 1
+
+
+@pytest.mark.parametrize('reply', ['Sorry, I cannot help with that.', '["Paris"]', '{not json}'])
+def test_unparseable_replies_are_not_cached(reply):
+    model = FakeModel(lambda prompt: reply)
+    answerer = FallbackAnswerer(model)
+
+    assert parse_response(reply, 1) is None
+    assert answerer.answer('u', ['City'], QA_LIST, 'v1') == {}
+    assert answerer.answer('u', ['City'], QA_LIST, 'v1') == {}
+    assert len(model.prompts) == 2
+
+
+def test_overrun_call_returns_nothing_then_fills_the_cache():
+    gate = threading.Event()
+    model = FakeModel(answer_all, gate)
+    answerer = FallbackAnswerer(model, time_budget=0.05)
+
+    started = time.monotonic()
+    assert answerer.answer('u', ['City'], QA_LIST, 'v1') == {}
+    assert time.monotonic() - started < 1
+    assert answerer.stats()['timeouts'] == 1
+
+    gate.set()
+    wait_for(lambda: answerer.stats()['entries'] == 1)
+    assert answerer.answer('u', ['City'], QA_LIST, 'v1') == {'City': 'answer City'}
+    assert len(model.prompts) == 1
+
+
+def test_calls_are_shed_while_all_slots_are_busy():
+    gate = threading.Event()
+    model = FakeModel(answer_all, gate)
+    answerer = FallbackAnswerer(model, time_budget=0.05, max_in_flight=1)
+
+    assert answerer.answer('u', ['City'], QA_LIST, 'v1') == {}
+    # The only slot is held by the stalled call, so no new call is made
+    assert answerer.answer('u', ['Degree'], QA_LIST, 'v1') == {}
+    assert len(model.prompts) == 1
+
+    gate.set()
+    wait_for(lambda: answerer.stats()['entries'] == 1)
+    assert answerer.answer('u', ['Degree'], QA_LIST, 'v1') == {'Degree': 'answer Degree'}
+    assert len(model.prompts) == 2
+
+
+def test_model_errors_free_the_slot():
+    def fail(prompt):
+        raise RuntimeError('quota exceeded')
+
+    model = FakeModel(fail)
+    answerer = FallbackAnswerer(model, max_in_flight=1)
+
+    assert answerer.answer('u', ['City'], QA_LIST, 'v1') == {}
+    assert answerer.answer('u', ['City'], QA_LIST, 'v1') == {}
+    assert len(model.prompts) == 2
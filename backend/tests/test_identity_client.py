@@ -0,0 +1,155 @@
+"""IdentityToolkitClient retries, deadline and circuit breaker."""
+import pytest
+import requests
+
+from identity_client import CircuitBreaker, IdentityServiceUnavailable, IdentityToolkitClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeSession:
+    # Plays back `outcomes` (status codes or exceptions), each taking
+    # `latency` seconds of fake time
+    def __init__(self, clock, outcomes, latency=0.1):
+        self.clock = clock
+        self.outcomes = list(outcomes)
+        self.latency = latency
+        self.timeouts = []
+
+    def post(self, url, params, json, timeout):
+        self.timeouts.append(timeout)
+        outcome = self.outcomes.pop(0)
+        # A stalled connect uses up the connect timeout; anything else may
+        # use both
+        if isinstance(outcome, requests.ConnectTimeout):
+            self.clock.advance(min(self.latency, timeout[0]))
+        else:
+            self.clock.advance(min(self.latency, timeout[0] + timeout[1]))
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        return response
+
+
+def make_client(outcomes, latency=0.1, breaker=None, clock=None, **kwargs):
+    clock = clock or FakeClock()
+    session = FakeSession(clock, outcomes, latency)
+    client = IdentityToolkitClient(
+        'key', session=session, breaker=breaker or CircuitBreaker(failure_threshold=100, clock=clock),
+        sleep=clock.advance, clock=clock, **kwargs
+    )
+    return client, session, clock
+
+
+def sign_in(client):
+    return client.sign_in_with_password('ada@example.com', 'secret')
+
+
+@pytest.mark.parametrize('failure', [
+    requests.ConnectionError('refused'),
+    requests.ConnectTimeout('connect timed out'),
+    429,
+    503
+])
+def test_retries_failures_that_were_not_processed(failure):
+    client, session, _ = make_client([failure, failure, 200])
+    assert sign_in(client).status_code == 200
+    assert len(session.timeouts) == 3
+
+
+@pytest.mark.parametrize('failure', [requests.ReadTimeout('read timed out'), 500, 502, 504])
+def test_does_not_resend_a_sign_in_that_may_have_been_processed(failure):
+    client, session, _ = make_client([failure, 200])
+    with pytest.raises(IdentityServiceUnavailable):
+        sign_in(client)
+    assert len(session.timeouts) == 1
+
+
+def test_client_errors_are_returned_not_retried():
+    client, session, _ = make_client([400])
+    assert sign_in(client).status_code == 400
+    assert len(session.timeouts) == 1
+
+
+def test_gives_up_after_max_retries():
+    client, session, _ = make_client([503] * 5, max_retries=2)
+    with pytest.raises(IdentityServiceUnavailable):
+        sign_in(client)
+    assert len(session.timeouts) == 3
+
+
+def test_deadline_bounds_a_slow_connect_and_read():
+    client, session, clock = make_client(
+        [requests.ReadTimeout('read timed out')], latency=100, connect_timeout=4, read_timeout=10, deadline=8
+    )
+    with pytest.raises(IdentityServiceUnavailable):
+        sign_in(client)
+    assert clock.now <= 8
+
+
+def test_deadline_caps_timeouts_and_total_time():
+    stall = requests.ConnectTimeout('connect timed out')
+    client, session, clock = make_client(
+        [stall] * 10, latency=100, connect_timeout=4, read_timeout=10, max_retries=9, deadline=10
+    )
+    with pytest.raises(IdentityServiceUnavailable):
+        sign_in(client)
+    assert clock.now <= 10
+    assert all(connect <= 4 and read <= 10 for connect, read in session.timeouts)
+    # The last attempt only gets what is left of the deadline
+    assert session.timeouts[-1][1] < 10
+
+
+def test_circuit_opens_then_lets_one_trial_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    client, session, _ = make_client([503, 503, 200], breaker=breaker, clock=clock, max_retries=0)
+
+    for _ in range(2):
+        with pytest.raises(IdentityServiceUnavailable):
+            sign_in(client)
+    assert breaker.state == 'open'
+
+    # Fails fast without calling upstream while open
+    with pytest.raises(IdentityServiceUnavailable, match='circuit is open'):
+        sign_in(client)
+    assert len(session.timeouts) == 2
+
+    clock.advance(30)
+    assert breaker.state == 'half-open'
+    # The trial call succeeds and closes the circuit
+    assert sign_in(client).status_code == 200
+    assert breaker.state == 'closed'
+
+
+def test_half_open_allows_one_trial_at_a_time():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.advance(30)
+
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_failed_trial_reopens_the_circuit():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.advance(30)
+
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    clock.advance(29)
+    assert not breaker.allow()
@@ -0,0 +1,112 @@
+"""The indexed matchers must agree with the brute-force reference."""
+import os
+import random
+
+import pytest
+
+from features import question_features
+from index_store import IndexStore, MappedIndex
+from kb_cache import knowledge_base_version
+from matcher import MatchIndex, iter_matches, match_questions_brute_force
+
+# Small vocabulary so entries share words, tie on score and repeat exactly
+WORDS = (
+    'full name email address phone number city country date birth college '
+    'degree year skills linkedin github salary notice period relocate'
+).split()
+STOPWORDS = ('what', 'is', 'your', 'the', 'of', 'please', 'enter')
+
+
+def make_question(rng):
+    words = [rng.choice(WORDS + list(STOPWORDS)) for _ in range(rng.randint(1, 6))]
+    return ' '.join(words).capitalize() + rng.choice(('', '?', ':'))
+
+
+def make_knowledge_base(rng, size):
+    qa_list = []
+    for position in range(size):
+        question = make_question(rng)
+        qa = {'id': f'qa{position:04d}', 'question': question, 'answer': f'Answer {position}'}
+        # Mix items with precomputed features and legacy items without them
+        if rng.random() < 0.7:
+            qa.update(question_features(question))
+        qa_list.append(qa)
+    return qa_list
+
+
+def make_form(rng, qa_list, size):
+    questions = []
+    for _ in range(size):
+        roll = rng.random()
+        if roll < 0.1:
+            text = ''
+        elif roll < 0.2:
+            text = ' '.join(rng.choice(STOPWORDS) for _ in range(rng.randint(1, 3)))
+        elif roll < 0.5 and qa_list:
+            words = rng.choice(qa_list)['question'].split()
+            rng.shuffle(words)
+            text = ' '.join(words).upper()
+        else:
+            text = make_question(rng)
+        questions.append({'question': text})
+    return questions
+
+
+def indexed_answers(questions, index):
+    return [answer for _, answer in iter_matches(questions, index)]
+
+
+@pytest.fixture
+def mapped_index(tmp_path):
+    indexes = []
+
+    def load(qa_list):
+        index = IndexStore(str(tmp_path)).load('user', qa_list, knowledge_base_version(qa_list))
+        assert isinstance(index, MappedIndex)
+        indexes.append(index)
+        return index
+
+    yield load
+    for index in indexes:
+        index.close()
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_indexes_match_brute_force(seed, mapped_index):
+    rng = random.Random(seed)
+    qa_list = make_knowledge_base(rng, rng.randint(0, 60))
+    questions = make_form(rng, qa_list, 40)
+
+    expected = match_questions_brute_force(questions, qa_list)
+    assert indexed_answers(questions, MatchIndex(qa_list)) == expected
+    assert indexed_answers(questions, mapped_index(qa_list)) == expected
+
+
+def test_empty_and_stopword_only_questions(mapped_index):
+    qa_list = [
+        {'id': 'a', 'question': 'What is your name?', 'answer': 'Ada'},
+        {'id': 'b', 'question': 'What is it', 'answer': 'Stopwords'},
+        {'id': 'c', 'question': '', 'answer': 'Blank'}
+    ]
+    questions = [{'question': ''}, {'question': '   '}, {'question': 'what is'}, {'question': 'the'}]
+
+    expected = match_questions_brute_force(questions, qa_list)
+    assert [answer['answer'] for answer in expected] == ['Stopwords']
+    assert indexed_answers(questions, MatchIndex(qa_list)) == expected
+    assert indexed_answers(questions, mapped_index(qa_list)) == expected
+
+
+def test_on_demand_index_writes_keep_only_recent_versions(tmp_path):
+    store = IndexStore(str(tmp_path), keep_versions=2)
+    for position in range(5):
+        qa_list = [{'id': 'a', 'question': f'Question {position}', 'answer': 'x'}]
+        kb_version = knowledge_base_version(qa_list)
+        index = store.load('user', qa_list, kb_version)
+        assert isinstance(index, MappedIndex)
+        index.close()
+        # Distinct modification times, newest last
+        os.utime(store.path('user', kb_version), (position, position))
+
+    remaining = os.listdir(os.path.dirname(store.path('user', kb_version)))
+    assert len(remaining) == 2
+    assert f'{kb_version}.idx' in remaining
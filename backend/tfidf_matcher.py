@@ -0,0 +1,109 @@
+"""TF-IDF matching engine for /api/process-form.
+
+Questions are represented as bags of words plus character trigrams of each
+word, weighted by TF-IDF and L2-normalized. The knowledge base is compiled
+into a sparse matrix once, and all form questions are scored with a single
+sparse matrix product. Trigrams make the match tolerant of typos and
+inflections, and the bag representation ignores word order.
+"""
+import re
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Minimum cosine similarity for a knowledge-base entry to count as a match
+TFIDF_MATCH_THRESHOLD = 0.4
+
+NGRAM_SIZE = 3
+
+WORD_RE = re.compile(r'\w+')
+
+
+def extract_features(text):
+    features = []
+    for word in WORD_RE.findall(text.lower()):
+        features.append('w:' + word)
+        padded = f' {word} '
+        for start in range(len(padded) - NGRAM_SIZE + 1):
+            features.append(padded[start:start + NGRAM_SIZE])
+    return Counter(features)
+
+
+def normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return csr_matrix(matrix.multiply(1.0 / norms[:, np.newaxis]), dtype=np.float32)
+
+
+class TfidfIndex:
+    default_threshold = TFIDF_MATCH_THRESHOLD
+
+    def __init__(self, qa_list):
+        self.entries = list(qa_list)
+        self.vocabulary = {}
+
+        indptr = [0]
+        indices = []
+        counts = []
+        for qa in self.entries:
+            for feature, count in extract_features(qa.get('question', '')).items():
+                indices.append(self.vocabulary.setdefault(feature, len(self.vocabulary)))
+                counts.append(count)
+            indptr.append(len(indices))
+
+        shape = (len(self.entries), len(self.vocabulary))
+        indices = np.asarray(indices, dtype=np.int32)
+        term_freqs = csr_matrix(
+            (np.asarray(counts, dtype=np.float32), indices, np.asarray(indptr, dtype=np.int32)),
+            shape=shape
+        )
+
+        # Smoothed IDF, as in the usual TF-IDF formulation
+        doc_freqs = np.bincount(indices, minlength=len(self.vocabulary))
+        self.idf = (np.log((1 + len(self.entries)) / (1 + doc_freqs)) + 1).astype(np.float32)
+
+        # Stored transposed so scoring is a plain (questions x features) @
+        # (features x entries) product
+        self.matrix_t = normalize_rows(term_freqs.multiply(self.idf)).T.tocsr()
+
+    def vectorize(self, texts):
+        indptr = [0]
+        indices = []
+        counts = []
+        for text in texts:
+            for feature, count in extract_features(text).items():
+                # Features never seen in the knowledge base can't contribute
+                # to any dot product, so they are dropped up front
+                column = self.vocabulary.get(feature)
+                if column is not None:
+                    indices.append(column)
+                    counts.append(count)
+            indptr.append(len(indices))
+
+        indices = np.asarray(indices, dtype=np.int32)
+        term_freqs = csr_matrix(
+            (np.asarray(counts, dtype=np.float32), indices, np.asarray(indptr, dtype=np.int32)),
+            shape=(len(texts), len(self.vocabulary))
+        )
+        return normalize_rows(term_freqs.multiply(self.idf))
+
+    def best_matches(self, texts):
+        if not texts:
+            return []
+        if not self.entries:
+            return [(None, 0) for _ in texts]
+
+        # Real-world questions share common trigrams, so the score matrix is
+        # mostly dense; reducing it densely is much faster than sparse argmax
+        scores = (self.vectorize(texts) @ self.matrix_t).toarray()
+        best_positions = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(texts)), best_positions]
+
+        matches = []
+        for position, score in zip(best_positions, best_scores):
+            if score > 0:
+                matches.append((self.entries[position], float(score)))
+            else:
+                matches.append((None, 0))
+        return matches
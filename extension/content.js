@@ -115,98 +115,176 @@ function normalizeQuestion(question) {
     return normalized;
 }
 
-// Function to fill form fields
-async function fillFormFields(answers) {
-    const questions = extractQuestions();
-    let filledCount = 0;
-    let errorCount = 0;
-    
-    console.log('Questions to fill:', questions);
-    console.log('Answers received:', answers);
-    
-    for (const answer of answers) {
-        console.log(`Processing answer for question: "${answer.question}"`);
-        console.log(`Matched with knowledge base question: "${answer.matched_question}"`);
-        
-        const matchingQuestion = questions.find(q => q.question === answer.question);
-        
-        if (matchingQuestion) {
-            try {
-                if (matchingQuestion.type === 'radio' && matchingQuestion.options) {
-                    // Match answer to label (case-insensitive, trimmed)
-                    const match = matchingQuestion.options.find(opt =>
-                        opt.label && opt.label.toLowerCase().trim() === answer.answer.toLowerCase().trim()
-                    );
-                    if (match) {
-                        match.element.checked = true;
-                        match.element.dispatchEvent(new Event('change', { bubbles: true }));
-                        filledCount++;
-                        console.log(`Selected radio option: ${match.label}`);
-                        continue;
-                    } else {
-                        // Try partial match if exact match fails
-                        const partial = matchingQuestion.options.find(opt =>
-                            opt.label && opt.label.toLowerCase().includes(answer.answer.toLowerCase())
-                        );
-                        if (partial) {
-                            partial.element.checked = true;
-                            partial.element.dispatchEvent(new Event('change', { bubbles: true }));
-                            filledCount++;
-                            console.log(`Selected radio option (partial match): ${partial.label}`);
-                            continue;
-                        }
-                    }
-                    errorCount++;
-                    console.warn(`No matching radio option found for answer: ${answer.answer}`);
-                }
-                else if (matchingQuestion.type === 'checkbox') {
-                    const element = matchingQuestion.element;
-                    const shouldCheck = ['yes', 'true', '1'].includes(answer.answer.toLowerCase());
-                    element.checked = shouldCheck;
-                    element.dispatchEvent(new Event('change', { bubbles: true }));
-                    filledCount++;
-                }
-                else if (matchingQuestion.type === 'select-one' || matchingQuestion.type === 'SELECT') {
-                    const element = matchingQuestion.element;
+// Fills one form field with an answer. Returns true if the field was filled.
+function fillField(matchingQuestion, answer) {
+    if (matchingQuestion.type === 'radio' && matchingQuestion.options) {
+        // Match answer to label (case-insensitive, trimmed)
+        const match = matchingQuestion.options.find(opt =>
+            opt.label && opt.label.toLowerCase().trim() === answer.answer.toLowerCase().trim()
+        );
+        if (match) {
+            match.element.checked = true;
+            match.element.dispatchEvent(new Event('change', { bubbles: true }));
+            console.log(`Selected radio option: ${match.label}`);
+            return true;
+        }
+        // Try partial match if exact match fails
+        const partial = matchingQuestion.options.find(opt =>
+            opt.label && opt.label.toLowerCase().includes(answer.answer.toLowerCase())
+        );
+        if (partial) {
+            partial.element.checked = true;
+            partial.element.dispatchEvent(new Event('change', { bubbles: true }));
+            console.log(`Selected radio option (partial match): ${partial.label}`);
+            return true;
+        }
+        console.warn(`No matching radio option found for answer: ${answer.answer}`);
+        return false;
+    }
+    else if (matchingQuestion.type === 'checkbox') {
+        const element = matchingQuestion.element;
+        const shouldCheck = ['yes', 'true', '1'].includes(answer.answer.toLowerCase());
+        element.checked = shouldCheck;
+        element.dispatchEvent(new Event('change', { bubbles: true }));
+        return true;
+    }
+    else if (matchingQuestion.type === 'select-one' || matchingQuestion.type === 'SELECT') {
+        const element = matchingQuestion.element;
         const options = Array.from(element.options);
-                    const matchingOption = options.find(opt => 
-                        opt.text.toLowerCase() === answer.answer.toLowerCase() ||
-                        opt.value.toLowerCase() === answer.answer.toLowerCase()
+        const matchingOption = options.find(opt =>
+            opt.text.toLowerCase() === answer.answer.toLowerCase() ||
+            opt.value.toLowerCase() === answer.answer.toLowerCase()
         );
         if (matchingOption) {
             element.value = matchingOption.value;
-                        element.dispatchEvent(new Event('change', { bubbles: true }));
-                        filledCount++;
-                    } else {
-                        errorCount++;
-                        console.warn(`No matching select option found for answer: ${answer.answer}`);
-                    }
-                }
-                else {
-                    // For text inputs, textareas, and other input types
-                    const element = matchingQuestion.element;
-                    element.value = answer.answer;
-                    element.dispatchEvent(new Event('input', { bubbles: true }));
-                    element.dispatchEvent(new Event('change', { bubbles: true }));
-                    filledCount++;
-                }
-                
-                console.log(`Successfully filled field: "${matchingQuestion.question}"`);
-                
-            } catch (error) {
-                console.error('Error filling field:', error);
-                errorCount++;
-            }
+            element.dispatchEvent(new Event('change', { bubbles: true }));
+            return true;
+        }
+        console.warn(`No matching select option found for answer: ${answer.answer}`);
+        return false;
+    }
+    else {
+        // For text inputs, textareas, and other input types
+        const element = matchingQuestion.element;
+        element.value = answer.answer;
+        element.dispatchEvent(new Event('input', { bubbles: true }));
+        element.dispatchEvent(new Event('change', { bubbles: true }));
+        return true;
+    }
+}
+
+// Fills one answer into the matching field and updates the counters
+function applyAnswer(questions, answer, counts) {
+    // Streamed answers carry the field index (compact ones carry only the
+    // index, not the question text); fall back to matching the question text
+    let matchingQuestion = null;
+    if (answer.index !== undefined && questions[answer.index]
+        && (answer.question === undefined || questions[answer.index].question === answer.question)) {
+        matchingQuestion = questions[answer.index];
+    } else {
+        matchingQuestion = questions.find(q => q.question === answer.question);
+    }
+    console.log(`Processing answer for question: "${matchingQuestion ? matchingQuestion.question : answer.question}" (${answer.source || 'knowledge_base'}, score ${answer.match_score})`);
+
+    if (!matchingQuestion) {
+        console.log(`No matching field found for question: "${answer.question ?? answer.index}"`);
+        return;
+    }
+
+    try {
+        if (fillField(matchingQuestion, answer)) {
+            counts.filled++;
+            console.log(`Successfully filled field: "${matchingQuestion.question}"`);
         } else {
-            console.log(`No matching field found for question: "${answer.question}"`);
+            counts.errors++;
         }
+    } catch (error) {
+        console.error('Error filling field:', error);
+        counts.errors++;
     }
-    
-    console.log(`Form fill complete. Filled ${filledCount} fields, ${errorCount} errors.`);
+}
+
+// Reads an NDJSON response body line by line, calling onRecord for each
+// record as soon as it arrives
+async function readNDJSON(response, onRecord) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let newline;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (line) onRecord(JSON.parse(line));
+        }
+    }
+
+    buffer += decoder.decode();
+    if (buffer.trim()) onRecord(JSON.parse(buffer));
+}
+
+// The backend answers 429 with Retry-After when this user is sending forms
+// too quickly or the server is busy; wait as asked and retry a few times
+const PROCESS_FORM_MAX_RETRIES = 2;
+const PROCESS_FORM_MAX_RETRY_WAIT_MS = 5000;
+
+async function postProcessForm(token, questions) {
+    for (let attempt = 0; ; attempt++) {
+        const response = await fetch(`${config.BACKEND_URL}/api/process-form?stream=1`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'application/x-ndjson',
+                'Authorization': `Bearer ${token}`
+            },
+            body: JSON.stringify({
+                questions: questions.map(q => ({ question: q.question })),
+                compact: true
+            })
+        });
+        if (response.status !== 429 || attempt >= PROCESS_FORM_MAX_RETRIES) {
+            return response;
+        }
+        const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 1;
+        console.log(`Backend busy, retrying form in ${retryAfter}s`);
+        await new Promise(resolve => setTimeout(resolve, Math.min(retryAfter * 1000, PROCESS_FORM_MAX_RETRY_WAIT_MS)));
+    }
+}
+
+// Streams answers from the backend and fills each field as its answer
+// arrives, instead of waiting for the whole form to be processed
+async function streamAndFillForm(token) {
+    const questions = extractQuestions();
+    const counts = { filled: 0, errors: 0 };
+    console.log('Extracted questions:', questions);
+
+    const backendResponse = await postProcessForm(token, questions);
+
+    if (!backendResponse.ok) {
+        const errorData = await backendResponse.json();
+        throw new Error(errorData.error || 'Failed to get answers from backend');
+    }
+
+    await readNDJSON(backendResponse, (record) => {
+        if (record.type === 'answer') {
+            applyAnswer(questions, record, counts);
+        } else if (record.type === 'summary') {
+            console.log('Form processing summary:', record);
+        } else if (record.type === 'error') {
+            console.error('Backend error while streaming answers:', record.error);
+        }
+    });
+
+    console.log(`Form fill complete. Filled ${counts.filled} fields, ${counts.errors} errors.`);
     return {
         total: questions.length,
-        filled: filledCount,
-        errors: errorCount
+        filled: counts.filled,
+        errors: counts.errors
     };
 }
 
@@ -233,31 +311,8 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
             }
             
             try {
-                const questions = extractQuestions();
-                console.log('Extracted questions:', questions);
-                
-                // Send questions to backend
-                const backendResponse = await fetch(`${config.BACKEND_URL}/api/process-form`, {
-            method: 'POST',
-            headers: {
-                        'Content-Type': 'application/json',
-                        'Authorization': `Bearer ${response.token}`
-            },
-            body: JSON.stringify({
-                        questions: questions.map(q => ({ question: q.question }))
-            })
-        });
-                
-                if (!backendResponse.ok) {
-                    const errorData = await backendResponse.json();
-                    throw new Error(errorData.error || 'Failed to get answers from backend');
-                }
-                
-                const answers = await backendResponse.json();
-                console.log('Received answers:', answers);
-                
-                // Fill the form with answers
-                const result = await fillFormFields(answers);
+                // Fill fields progressively as the backend streams answers
+                const result = await streamAndFillForm(response.token);
                 console.log('Form fill result:', result);
                 
                 sendResponse({
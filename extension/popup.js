@@ -237,6 +237,86 @@ fillFormBtn.addEventListener('click', async () => {
     }
 });
 
+// Q&A Sync
+// The popup keeps a copy of the knowledge base in local storage and only
+// asks the backend for what changed since the last sync. Deltas are always
+// read from storage, so the backend answers them with a (possibly empty)
+// page rather than a 304.
+const QA_SYNC_PAGE_SIZE = 500;
+
+async function getQASyncState() {
+    return new Promise((resolve) => {
+        chrome.storage.local.get(['qaSync'], (result) => resolve(result.qaSync || null));
+    });
+}
+
+async function setQASyncState(state) {
+    return new Promise((resolve) => {
+        chrome.storage.local.set({ qaSync: state }, resolve);
+    });
+}
+
+// Fetches every page of a listing. Pages may come from different backend
+// workers, so the earliest server_time is the one that is safe to sync from.
+async function fetchQAPages(token, params) {
+    const items = [];
+    const deleted = [];
+    let cursor = null;
+    let serverTime = null;
+
+    do {
+        const query = new URLSearchParams({ ...params, limit: QA_SYNC_PAGE_SIZE });
+        if (cursor) {
+            query.set('cursor', cursor);
+        }
+        const headers = {
+            'Authorization': `Bearer ${token}`,
+            'Accept': 'application/json'
+        };
+
+        const response = await fetch(`${config.BACKEND_URL}/api/qa?${query}`, { headers });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || data.message || 'Failed to load Q&A items');
+        }
+
+        if (!serverTime || Date.parse(data.server_time) < Date.parse(serverTime)) {
+            serverTime = data.server_time;
+        }
+        items.push(...data.items);
+        deleted.push(...data.deleted);
+        cursor = data.next_cursor;
+    } while (cursor);
+
+    return { items, deleted, serverTime };
+}
+
+async function syncQAs(token) {
+    const state = await getQASyncState();
+
+    if (!state) {
+        const result = await fetchQAPages(token, {});
+        await setQASyncState({ items: result.items, serverTime: result.serverTime });
+        return result.items;
+    }
+
+    const result = await fetchQAPages(token, { since: state.serverTime });
+    if (!result.items.length && !result.deleted.length) {
+        console.log('Q&A items unchanged since last sync');
+        await setQASyncState({ ...state, serverTime: result.serverTime });
+        return state.items;
+    }
+
+    // Apply the delta: drop deleted ids, then upsert changed items
+    const byId = new Map(state.items.map(item => [item.id, item]));
+    result.deleted.forEach(id => byId.delete(id));
+    result.items.forEach(item => byId.set(item.id, item));
+    const items = Array.from(byId.values()).sort((a, b) => (a.id < b.id ? -1 : a.id > b.id ? 1 : 0));
+
+    await setQASyncState({ items, serverTime: result.serverTime });
+    return items;
+}
+
 // Q&A Management
 async function loadQAs() {
     try {
@@ -249,22 +329,7 @@ async function loadQAs() {
         }
 
         console.log('Loading Q&A items...');
-        const response = await fetch(`${config.BACKEND_URL}/api/qa`, {
-            headers: {
-                'Authorization': `Bearer ${token}`,
-                'Accept': 'application/json'
-            }
-        });
-
-        console.log('Response status:', response.status);
-        const data = await response.json();
-        console.log('Response data:', data);
-
-        if (!response.ok) {
-            throw new Error(data.error || data.message || 'Failed to load Q&A items');
-        }
-
-        qaItems = data;
+        qaItems = await syncQAs(token);
         console.log('Loaded Q&A items:', qaItems);
         renderQAs();
     } catch (error) {
@@ -531,8 +596,11 @@ function showMainSection(user) {
 async function storeToken(token) {
     return new Promise((resolve) => {
         chrome.storage.sync.set({ token }, () => {
-            // Also store the token in local storage for immediate access
-            chrome.storage.local.set({ token }, resolve);
+            // Also store the token in local storage for immediate access,
+            // and drop any Q&A copy synced for a previous account
+            chrome.storage.local.set({ token }, () => {
+                chrome.storage.local.remove(['qaSync'], resolve);
+            });
         });
     });
 }
@@ -561,8 +629,8 @@ async function getStoredToken() {
 
 async function removeStoredToken() {
     return new Promise((resolve) => {
-        // Remove from both storages
-        chrome.storage.local.remove(['token'], () => {
+        // Remove from both storages, along with the synced Q&A copy
+        chrome.storage.local.remove(['token', 'qaSync'], () => {
             chrome.storage.sync.remove(['token'], resolve);
         });
     });